@@ -1,12 +1,19 @@
 import os
-import pandas as pd
+import time
 import streamlit as st
 from dotenv import load_dotenv
+import llm_cache
+import llm_client
+import feedback_model
+import jobs
+import storage
+import telemetry
 from core import (
-    init_client, get_article_text, split_text, analyze_text_part,
-    combine_analyses, extract_company_name
+    init_client, extract_company_name, chat_completion,
+    run_analysis_pipeline, run_compare_pipeline, run_matrix_pipeline, format_matrix, matrix_cell,
+    ANALYSIS_SECTIONS, ANALYSIS_REUSE_MAX_AGE
 )
-from openai import OpenAI
+from feedback import classify_feedback_csv, read_checkpoint, stage_upload
 
 # --- Load API key ---
 load_dotenv()
@@ -18,59 +25,22 @@ if not api_key:
 # --- Initialize client ---
 init_client(api_key)
 
-# --- Show loading on startup ---
-if "app_loaded" not in st.session_state:
-    # Create a centered loading display
-    st.markdown("""
-    <div style="display: flex; justify-content: center; align-items: center; height: 50vh;">
-        <div style="text-align: center;">
-            <h1 style="font-size: 3rem; margin-bottom: 2rem;">🚀</h1>
-            <h2 style="font-size: 2rem; color: #2E86C1; margin-bottom: 1rem;">Loading Competitor Analysis Tool</h2>
-            <div style="font-size: 1.5rem; color: #666;">Please wait...</div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    import time
-    time.sleep(3)  # Simulate loading time
-    
-    st.session_state.app_loaded = True
-    st.rerun()  # Refresh the page to show the actual app
-
-# --- Files for storing user data ---
-INSIGHTS_FILE = "insights.csv"
-ANALYSIS_HISTORY_FILE = "analysis_history.csv"
-COMPARE_HISTORY_FILE = "compare_history.csv"
-
-# --- Load existing insights ---
-if os.path.exists(INSIGHTS_FILE):
-    insights_df = pd.read_csv(INSIGHTS_FILE)
-else:
-    insights_df = pd.DataFrame(columns=["Company", "Improve", "Keep"])
-
-# --- Load persistent history ---
-if os.path.exists(ANALYSIS_HISTORY_FILE):
-    df_hist = pd.read_csv(ANALYSIS_HISTORY_FILE)
-    loaded_analysis_history = {
-        row["Company"]: {
-            "analysis": row["Analysis"],
-            "summary": row.get("Summary", "")
-        } for _, row in df_hist.iterrows()
-    }
-else:
-    loaded_analysis_history = {}
-
-if os.path.exists(COMPARE_HISTORY_FILE):
-    df_comp = pd.read_csv(COMPARE_HISTORY_FILE)
-    loaded_compare_history = dict(zip(df_comp["Comparison"], df_comp["Result"]))
-else:
-    loaded_compare_history = {}
+# --- Persistent storage (imports the old CSV files on first run) ---
+@st.cache_resource
+def init_storage():
+    """Create the history database and import the legacy CSVs once per process."""
+    return storage.migrate_from_csv()
+
+init_storage()
+
+# --- Prometheus endpoint (only when METRICS_PORT is set) ---
+@st.cache_resource
+def init_metrics():
+    return telemetry.start_metrics_server()
+
+init_metrics()
 
 # --- Initialize state ---
-if "analysis_history" not in st.session_state:
-    st.session_state.analysis_history = loaded_analysis_history
-if "compare_history" not in st.session_state:
-    st.session_state.compare_history = loaded_compare_history
 if "current_page" not in st.session_state:
     st.session_state.current_page = "home"
 if "analysis_result" not in st.session_state:
@@ -83,54 +53,6 @@ if "expanded_history_item" not in st.session_state:
     st.session_state.expanded_history_item = None
 if "expanded_compare_item" not in st.session_state:
     st.session_state.expanded_compare_item = None
-if "comparison_in_progress" not in st.session_state:
-    st.session_state.comparison_in_progress = False
-if "comparison_completed" not in st.session_state:
-    st.session_state.comparison_completed = False
-
-# --- Save insights ---
-def save_insights_to_csv(company_name, improvement, keep):
-    global insights_df
-    insights_df = insights_df[insights_df["Company"] != company_name]
-    new_row = {"Company": company_name, "Improve": improvement, "Keep": keep}
-    insights_df = pd.concat([insights_df, pd.DataFrame([new_row])], ignore_index=True)
-    insights_df.to_csv(INSIGHTS_FILE, index=False)
-
-# --- Save functions for history ---
-def save_analysis_history():
-    pd.DataFrame(
-        [{
-            "Company": c,
-            "Analysis": v["analysis"],
-            "Summary": v["summary"]
-        } for c, v in st.session_state.analysis_history.items()]
-    ).to_csv(ANALYSIS_HISTORY_FILE, index=False)
-
-def save_compare_history():
-    pd.DataFrame(
-        [{"Comparison": c, "Result": r} for c, r in st.session_state.compare_history.items()]
-    ).to_csv(COMPARE_HISTORY_FILE, index=False)
-
-# --- Helper for CSV feedback classification ---
-def classify_feedback(feedback_text):
-    prompt = f"""
-Classify the following user feedback into one of these categories:
-1. Bug
-2. Feature Request
-3. User Interface
-4. Other
-
-Feedback: {feedback_text}
-
-Reply with only the category name.
-"""
-    client = OpenAI(api_key=api_key)
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
-    return response.choices[0].message.content.strip()
 
 # --- Helper for translating company names to English ---
 def translate_company_name_to_english(company_name):
@@ -152,23 +74,118 @@ Rules:
 - Return only the company name, no explanations
 """
         try:
-            client = OpenAI(api_key=api_key)
-            response = client.chat.completions.create(
+            return chat_completion(
                 model="gpt-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0
             )
-            return response.choices[0].message.content.strip()
         except:
             return company_name
     
     return company_name
 
+# --- Background jobs for the analysis and compare pages ---
+JOB_POLL_SECONDS = 0.5
+STAGE_LABELS = {
+    "fetch": "Fetching article",
+    "identify": "Identifying company",
+    "dedupe": "Checking for duplicates",
+    "chunk": "Splitting text",
+    "analyze": "Analyzing article",
+    "map": "Analyzing parts",
+    "reduce": "Merging analyses",
+    "summary": "Writing summary",
+    "compare": "Comparing companies",
+    "sections": "Summarizing sections",
+    "matrix": "Comparing pairs",
+}
+
+def run_analysis_job(job, text_or_url, company_name, incremental=True):
+    """Background job: analyze one company and save it to history.
+
+    With incremental, new material is merged into the company's stored analysis.
+    """
+    return run_analysis_pipeline(
+        text_or_url, company_name, on_progress=job.progress, on_delta=job.append_text,
+        reuse_max_age=ANALYSIS_REUSE_MAX_AGE, incremental=incremental, save=True
+    )
+
+def run_compare_job(job, input1, name1, input2, name2):
+    """Background job: compare two companies, merging both articles into their saved analyses."""
+    result = run_compare_pipeline(
+        input1, name1, input2, name2, on_progress=job.progress, on_delta=job.append_text, save=True
+    )
+    storage.save_comparison(f"{name1} vs {name2}", result["comparison"], name1, name2)
+    return result
+
+def run_matrix_job(job, inputs):
+    """Background job: build the comparison matrix, merging new articles into their saved analyses."""
+    result = run_matrix_pipeline(inputs, on_progress=job.progress, save=True)
+    storage.save_comparison(f"Matrix: {', '.join(result['companies'])}", format_matrix(result))
+    return result
+
+def run_feedback_job(job, input_path, output_path):
+    """Background job: classify a staged feedback CSV, resuming from its checkpoint."""
+    return classify_feedback_csv(
+        input_path, output_path, on_progress=lambda rows, done, total: job.progress("classify", done, total)
+    )
+
+def show_job_progress(job):
+    """Render the current stage of a running job as a progress bar."""
+    label = STAGE_LABELS.get(job["stage"], "Waiting to start")
+    if job["stage"] in ("map", "sections", "matrix") and job["total"]:
+        label = f"{label}: {job['done']}/{job['total']}"
+    st.progress(min(1.0, job["done"] / job["total"]) if job["total"] else 0.0, text=label)
+
+def show_duplicate_notice(duplicate):
+    """Tell the user a stored analysis was reused because the article is a near-duplicate."""
+    source = f" ({duplicate['url']})" if duplicate.get("url") else ""
+    st.info(
+        f"♻️ This article is {duplicate['similarity']:.0%} similar to one already analyzed for "
+        f"{duplicate['company']}{source}, so the saved analysis was reused."
+    )
+
+def show_run_telemetry(summary):
+    """Show where a finished run spent its time and how many tokens it used."""
+    with st.expander(f"⏱️ Timing and usage ({summary['seconds']:.1f}s)"):
+        if summary["stages"]:
+            st.table({
+                "Stage": list(summary["stages"]),
+                "Seconds": [f"{seconds:.2f}" for seconds in summary["stages"].values()],
+            })
+        st.caption(
+            f"{summary['calls']} LLM call(s), {summary['cache_hits']} from cache, {summary['retries']} retried · "
+            f"{summary['prompt_tokens']} prompt tokens ({summary['cached_tokens']} cached), "
+            f"{summary['completion_tokens']} completion tokens"
+        )
+
+# --- Helpers for the paginated history pages ---
+HISTORY_PAGE_SIZE = 20
+
+def load_history_page(search, list_fn, count_fn, search_fn, page_key):
+    """Return (entries, total) for the current page of a history list, searched or newest first."""
+    page = st.session_state.get(page_key, 1)
+    offset = (page - 1) * HISTORY_PAGE_SIZE
+    if search.strip():
+        return search_fn(search, limit=HISTORY_PAGE_SIZE, offset=offset)
+    return list_fn(limit=HISTORY_PAGE_SIZE, offset=offset), count_fn()
+
+def history_page_selector(total, page_key):
+    """Show a page picker when the list has more than one page."""
+    pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = 1
+        st.rerun()
+    if pages > 1:
+        shown = f"{total}+" if total >= storage.MAX_SEARCH_COUNT else str(total)
+        st.number_input(f"Page (1-{pages}, {shown} entries)", min_value=1, max_value=pages, step=1, key=page_key)
+
 # --- Sidebar Navigation ---
 nav_items = [
     ("home", "Home"),
     ("analysis", "🏢 Competitor Articles Analysis"),
     ("compare", "📊 Compare Two Companies"),
+    ("matrix", "🧮 Compare Many Companies"),
     ("history", "📜 View Analysis History"),
     ("compare_history", "📜 View Company Comparison History"),
     ("insights", "📌 Improvement & Preservation Notes"),
@@ -180,6 +197,20 @@ for key, label in nav_items:
         st.session_state.current_page = key
     st.sidebar.markdown("<br>", unsafe_allow_html=True)
 
+active_jobs = jobs.list_jobs(active_only=True)
+if active_jobs:
+    st.sidebar.caption(f"⏳ {len(active_jobs)} background job(s) running")
+
+cache_stats = llm_cache.counters()
+st.sidebar.caption(f"🗄 LLM cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+usage = telemetry.totals()
+st.sidebar.caption(f"🔢 Tokens: {usage['prompt_tokens']} prompt / {usage['completion_tokens']} completion")
+scheduler_stats = llm_client.stats()
+st.sidebar.caption(
+    f"📡 API queue: {scheduler_stats['queue_depth']} waiting, {scheduler_stats['in_flight']} in flight, "
+    f"{scheduler_stats['rate_limited']} rate-limited"
+)
+
 # --- Home ---
 if st.session_state.current_page == "home":
     st.markdown("<h2 style='text-align: center; color: #2E86C1;'>Welcome to the Competitor Analysis Tool</h2>", unsafe_allow_html=True)
@@ -214,6 +245,12 @@ if st.session_state.current_page == "home":
 
     ---
 
+    ### 🧮 Compare Many Companies
+    Pick saved companies and add new articles. Each company is analyzed once and
+    every pair is compared section by section in a matrix. Pairs compared before are reused.
+
+    ---
+
     ### 📜 Analysis History
     Review all past single company analyses.
 
@@ -242,53 +279,64 @@ if st.session_state.current_page == "analysis":
     if "detected_name" in st.session_state:
         st.info(f"✅ **Detected Company:** {st.session_state['detected_name']}")
 
+    merge_existing = False
+    if "detected_name" in st.session_state and storage.get_analysis(st.session_state["detected_name"]):
+        merge_existing = st.checkbox(
+            "Add this article to the existing analysis of this company", value=True,
+            help="Only the new parts of the article are analyzed and merged into the saved analysis."
+        )
+
     if "detected_name" in st.session_state and st.button("Analyze Company"):
         company_name = st.session_state["detected_name"]
         st.session_state.current_company = company_name
+        st.session_state.analysis_result = None
 
         input_text_or_url = st.session_state.get("company_input_saved", "")
-        with st.spinner("Analyzing company, please wait..."):
-            text = get_article_text(input_text_or_url) if input_text_or_url.startswith("http") else input_text_or_url
-
-            if not text:
-                st.error("Could not retrieve text for the company. Please provide a longer article or a valid URL.")
-            else:
-                parts = split_text(text)
-                analyses = [analyze_text_part(p) for p in parts]
-                analysis_text_only = combine_analyses(analyses)
-
-                summary_prompt = f"Summarize the following competitive analysis into one concise paragraph:\n\n{analysis_text_only}"
-                client = OpenAI(api_key=api_key)
-                summary_response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role": "user", "content": summary_prompt}],
-                    temperature=0
-                )
-                company_summary = summary_response.choices[0].message.content.strip()
-
-                st.session_state.analysis_result = analysis_text_only
-                st.session_state.analysis_summary = company_summary
-                st.session_state.analysis_history[company_name] = {
-                    "analysis": analysis_text_only,
-                    "summary": company_summary
-                }
-                save_analysis_history()
+        st.session_state.analysis_job = jobs.submit_job(
+            "analysis", run_analysis_job, input_text_or_url, company_name, merge_existing,
+            label=f"Analysis of {company_name}"
+        )
+
+    # Poll the background analysis until it finishes
+    if st.session_state.get("analysis_job"):
+        job = jobs.get_job(st.session_state.analysis_job)
+        if job is None or job["status"] == "failed":
+            st.error(job["error"] if job else "The analysis job was lost. Please run it again.")
+            del st.session_state.analysis_job
+        elif job["status"] == "done":
+            st.session_state.analysis_result = job["result"]["analysis"]
+            st.session_state.analysis_summary = job["result"]["summary"]
+            st.session_state.analysis_telemetry = job["result"]["telemetry"]
+            st.session_state.analysis_duplicate = job["result"]["duplicate_of"]
+            del st.session_state.analysis_job
+        else:
+            show_job_progress(job)
+            st.subheader(f"📌 Analysis of company {st.session_state.current_company}")
+            st.write(job["text"].get("analysis", ""))
+            if job["text"].get("summary"):
+                st.markdown(f"**Company Summary:** {job['text']['summary']}")
+            time.sleep(JOB_POLL_SECONDS)
+            st.rerun()
 
     if st.session_state.analysis_result and st.session_state.current_company:
         company_name = st.session_state.current_company
         # Ensure company name is in English for display
         english_company_name = translate_company_name_to_english(company_name)
         st.subheader(f"📌 Analysis of company {english_company_name}")
+        if st.session_state.get("analysis_duplicate"):
+            show_duplicate_notice(st.session_state.analysis_duplicate)
         st.write(st.session_state.analysis_result)
         st.markdown(f"**Company Summary:** {st.session_state.analysis_summary}")
+        if st.session_state.get("analysis_telemetry"):
+            show_run_telemetry(st.session_state.analysis_telemetry)
 
         existing_improve = st.session_state.get(f"{company_name}_improvement", "")
         existing_keep = st.session_state.get(f"{company_name}_keep", "")
 
-        if company_name in insights_df["Company"].values:
-            existing = insights_df[insights_df["Company"] == company_name].iloc[0]
-            existing_improve = existing["Improve"]
-            existing_keep = existing["Keep"]
+        existing = storage.get_insight(company_name)
+        if existing:
+            existing_improve = existing["improve"]
+            existing_keep = existing["keep"]
 
         st.subheader("📈 How can I improve compared to this competitor?")
         improve_text = st.text_area("Edit Improvement Notes", value=existing_improve)
@@ -297,13 +345,15 @@ if st.session_state.current_page == "analysis":
         keep_text = st.text_area("Edit Preservation Notes", value=existing_keep)
 
         if st.button("Save My Insights"):
-            save_insights_to_csv(company_name, improve_text, keep_text)
+            storage.save_insight(company_name, improve_text, keep_text)
             st.success("✅ Your insights have been saved.")
 
 
 # --- Compare Two Companies Page ---
 if st.session_state.current_page == "compare":
     st.header("📊 Compare Two Companies")
+    compare_job = jobs.get_job(st.session_state["compare_job"]) if st.session_state.get("compare_job") else None
+    comparison_running = compare_job is not None and compare_job["status"] in ("queued", "running")
     col1, col2 = st.columns(2)
     with col1:
         input1 = st.text_area("Company 1 article or URL")
@@ -312,12 +362,11 @@ if st.session_state.current_page == "compare":
                 detected1 = extract_company_name(input1)
                 st.session_state["detected_name1"] = detected1
                 st.session_state["company_input1_saved"] = input1
-                # Reset comparison flags when starting fresh
-                st.session_state["comparison_in_progress"] = False
-                st.session_state["comparison_completed"] = False
+                # Forget the previous comparison when starting fresh
+                st.session_state.pop("comparison_result", None)
         
         # Show detected company 1 name if available (but not during comparison)
-        if "detected_name1" in st.session_state and not st.session_state.get("comparison_in_progress", False):
+        if "detected_name1" in st.session_state and not comparison_running:
             st.info(f"✅ **Company 1:** {st.session_state['detected_name1']}")
             
     with col2:
@@ -327,153 +376,258 @@ if st.session_state.current_page == "compare":
                 detected2 = extract_company_name(input2)
                 st.session_state["detected_name2"] = detected2
                 st.session_state["company_input2_saved"] = input2
-                # Reset comparison flags when starting fresh
-                st.session_state["comparison_in_progress"] = False
-                st.session_state["comparison_completed"] = False
+                # Forget the previous comparison when starting fresh
+                st.session_state.pop("comparison_result", None)
         
         # Show detected company 2 name if available (but not during comparison)
-        if "detected_name2" in st.session_state and not st.session_state.get("comparison_in_progress", False):
+        if "detected_name2" in st.session_state and not comparison_running:
             st.info(f"✅ **Company 2:** {st.session_state['detected_name2']}")
 
     # Show comparison button when both companies are identified
     if "detected_name1" in st.session_state and "detected_name2" in st.session_state:
-        if not st.session_state.get("comparison_in_progress", False):
-            if st.button("Compare"):
-                # Set flag to prevent duplicate display during comparison
-                st.session_state["comparison_in_progress"] = True
-                st.session_state["comparison_completed"] = False
-                st.rerun()  # Force rerun to start comparison
-            
-        # Show comparison result if comparison is in progress
-        if st.session_state.get("comparison_in_progress", False) and not st.session_state.get("comparison_completed", False):
-            # Show company names during comparison (only once)
-            st.info(f"🔄 **Comparing:** {st.session_state['detected_name1']} vs {st.session_state['detected_name2']}")
-            
-            with st.spinner("Comparing companies, please wait..."):
-                name1 = st.session_state["detected_name1"]
-                name2 = st.session_state["detected_name2"]
-
-                text1_input = st.session_state.get("company_input1_saved", "")
-                text2_input = st.session_state.get("company_input2_saved", "")
-
-                text1 = get_article_text(text1_input) if text1_input.startswith("http") else text1_input
-                text2 = get_article_text(text2_input) if text2_input.startswith("http") else text2_input
-
-                analysis1 = combine_analyses([analyze_text_part(p) for p in split_text(text1)])
-                analysis2 = combine_analyses([analyze_text_part(p) for p in split_text(text2)])
-
-                compare_prompt = f"""
-Compare these two companies based only on their analyses:
-
-Company 1 ({name1}):
-{analysis1}
-
-Company 2 ({name2}):
-{analysis2}
+        name1 = st.session_state["detected_name1"]
+        name2 = st.session_state["detected_name2"]
+        if not comparison_running and st.button("Compare"):
+            st.session_state.pop("comparison_result", None)
+            st.session_state["compare_job"] = jobs.submit_job(
+                "compare", run_compare_job,
+                st.session_state.get("company_input1_saved", ""), name1,
+                st.session_state.get("company_input2_saved", ""), name2,
+                label=f"{name1} vs {name2}"
+            )
+            st.rerun()
+
+        if compare_job is not None:
+            if compare_job["status"] == "failed":
+                st.error(compare_job["error"])
+                del st.session_state["compare_job"]
+            elif compare_job["status"] == "done":
+                st.session_state["comparison_result"] = compare_job["result"]["comparison"]
+                st.session_state["comparison_telemetry"] = compare_job["result"]["telemetry"]
+                st.session_state["comparison_duplicates"] = [
+                    analysis["duplicate_of"] for analysis in compare_job["result"]["analyses"]
+                    if analysis["duplicate_of"]
+                ]
+                del st.session_state["compare_job"]
+            else:
+                st.info(f"🔄 **Comparing:** {compare_job['label']}")
+                show_job_progress(compare_job)
+                st.write(compare_job["text"].get("comparison", ""))
+                time.sleep(JOB_POLL_SECONDS)
+                st.rerun()
 
-Focus on:
-1. Target Market
-2. Strengths
-3. Weaknesses
-4. Main Services or Products
-5. Provide one final summary paragraph comparing both companies.
-"""
-                client = OpenAI(api_key=api_key)
-                compare_response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role": "user", "content": compare_prompt}],
-                    temperature=0
-                )
-                comparison_result = compare_response.choices[0].message.content.strip()
-                st.write(comparison_result)
-
-                st.session_state.compare_history[f"{name1} vs {name2}"] = comparison_result
-                st.session_state["comparison_result"] = comparison_result
-                save_compare_history()
-                
-                # Mark comparison as completed
-                st.session_state["comparison_completed"] = True
-                st.session_state["comparison_in_progress"] = False
-        
         # Show final result after comparison is completed
-        elif st.session_state.get("comparison_completed", False):
+        if st.session_state.get("comparison_result"):
             st.success("✅ **Comparison completed!**")
-            st.write(st.session_state.get("comparison_result", ""))
+            for duplicate in st.session_state.get("comparison_duplicates", []):
+                show_duplicate_notice(duplicate)
+            st.write(st.session_state["comparison_result"])
+            if st.session_state.get("comparison_telemetry"):
+                show_run_telemetry(st.session_state["comparison_telemetry"])
+
+# --- Comparison Matrix Page ---
+MATRIX_MAX_NEW_INPUTS = 8
+
+if st.session_state.current_page == "matrix":
+    st.header("🧮 Compare Many Companies")
+    matrix_job = jobs.get_job(st.session_state["matrix_job"]) if st.session_state.get("matrix_job") else None
+    matrix_running = matrix_job is not None and matrix_job["status"] in ("queued", "running")
+
+    saved_companies = [company for company, _ in storage.list_analyses()]
+    selected = st.multiselect("Saved companies", saved_companies)
+    new_count = st.number_input("New articles to analyze", min_value=0, max_value=MATRIX_MAX_NEW_INPUTS, value=0)
+    new_inputs = []
+    for i in range(int(new_count)):
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            text_or_url = st.text_area(f"Article or URL {i + 1}", key=f"matrix_input_{i}")
+        with col2:
+            name = st.text_input("Company (optional)", key=f"matrix_name_{i}")
+        if text_or_url.strip():
+            new_inputs.append((text_or_url, name.strip()))
+
+    inputs = [("", company) for company in selected] + new_inputs
+    if not matrix_running and st.button("Build Matrix", disabled=len(inputs) < 2):
+        st.session_state.pop("matrix_result", None)
+        st.session_state["matrix_job"] = jobs.submit_job(
+            "matrix", run_matrix_job, inputs, label=f"Comparison matrix of {len(inputs)} companies"
+        )
+        st.rerun()
+
+    if matrix_job is not None:
+        if matrix_job["status"] == "failed":
+            st.error(matrix_job["error"])
+            del st.session_state["matrix_job"]
+        elif matrix_job["status"] == "done":
+            st.session_state["matrix_result"] = matrix_job["result"]
+            del st.session_state["matrix_job"]
+        else:
+            st.info(f"🔄 **Building:** {matrix_job['label']}")
+            show_job_progress(matrix_job)
+            time.sleep(JOB_POLL_SECONDS)
+            st.rerun()
+
+    result = st.session_state.get("matrix_result")
+    if result:
+        pair_count = len(result["pairs"])
+        st.success(
+            f"✅ **Matrix completed!** {pair_count} pair(s), "
+            f"{pair_count - result['pairs_computed']} reused from earlier comparisons."
+        )
+        for analysis in result["analyses"]:
+            if analysis["duplicate_of"]:
+                show_duplicate_notice(analysis["duplicate_of"])
+        companies = result["companies"]
+        for key, heading in ANALYSIS_SECTIONS:
+            st.subheader(heading)
+            rows = {"": companies}
+            for column in companies:
+                rows[column] = [matrix_cell(result["matrix"][key][row].get(column), row) for row in companies]
+            st.table(rows)
+            with st.expander("Notes"):
+                for pair in result["pairs"]:
+                    st.markdown(f"**{pair['companies'][0]} vs {pair['companies'][1]}:** {pair['sections'][key]['note']}")
+        show_run_telemetry(result["telemetry"])
 
 # --- Analysis History Page ---
 if st.session_state.current_page == "history":
     st.header("📜 Analysis History")
-    if st.session_state.analysis_history:
-        for company, data in st.session_state.analysis_history.items():
+    search = st.text_input("🔍 Search companies, analyses and summaries", key="history_search")
+    companies, total = load_history_page(
+        search, storage.list_analyses, storage.count_analyses, storage.search_analyses, "history_page"
+    )
+    if companies:
+        for company, _ in companies:
             if st.button(company):
                 if st.session_state.expanded_history_item == company:
                     st.session_state.expanded_history_item = None
                 else:
                     st.session_state.expanded_history_item = company
             if st.session_state.expanded_history_item == company:
+                data = storage.get_analysis(company)
                 st.subheader("Full Analysis")
                 st.write(data["analysis"])
                 st.subheader("Summary")
                 st.write(data["summary"])
+        history_page_selector(total, "history_page")
+    elif search.strip():
+        st.info("No analyses match your search.")
     else:
         st.info("No previous analyses found.")
 
 # --- Comparison History Page ---
 if st.session_state.current_page == "compare_history":
     st.header("📜 Company Comparison History")
-    if st.session_state.compare_history:
-        for comp, result in st.session_state.compare_history.items():
+    search = st.text_input("🔍 Search comparisons", key="compare_history_search")
+    comparisons, total = load_history_page(
+        search, storage.list_comparisons, storage.count_comparisons, storage.search_comparisons,
+        "compare_history_page"
+    )
+    if comparisons:
+        for comp, _ in comparisons:
             if st.button(comp):
                 if st.session_state.expanded_compare_item == comp:
                     st.session_state.expanded_compare_item = None
                 else:
                     st.session_state.expanded_compare_item = comp
             if st.session_state.expanded_compare_item == comp:
-                st.write(result)
+                st.write(storage.get_comparison(comp))
+        history_page_selector(total, "compare_history_page")
+    elif search.strip():
+        st.info("No comparisons match your search.")
     else:
         st.info("No previous comparisons found.")
 
 # --- Improvement & Preservation Notes Page ---
 if st.session_state.current_page == "insights":
     st.header("📌 Improvement & Preservation Notes")
-    if not insights_df.empty:
-        company_list = insights_df["Company"].tolist()
+    company_list = storage.list_insight_companies()
+    if company_list:
         selected_company = st.selectbox("Select a company to edit or delete", company_list)
 
         if selected_company:
-            current_data = insights_df[insights_df["Company"] == selected_company].iloc[0]
-            edit_improve = st.text_area("✏️ Edit 'Improve'", value=current_data["Improve"])
-            edit_keep = st.text_area("✏️ Edit 'Keep'", value=current_data["Keep"])
+            current_data = storage.get_insight(selected_company)
+            edit_improve = st.text_area("✏️ Edit 'Improve'", value=current_data["improve"])
+            edit_keep = st.text_area("✏️ Edit 'Keep'", value=current_data["keep"])
 
             if st.button("💾 Save Changes"):
-                save_insights_to_csv(selected_company, edit_improve, edit_keep)
+                storage.save_insight(selected_company, edit_improve, edit_keep)
                 st.success(f"✅ Notes for {selected_company} have been updated.")
                 st.rerun()
 
             if st.button("🗑 Delete This Entry"):
-                updated_df = insights_df[insights_df["Company"] != selected_company]
-                updated_df.to_csv(INSIGHTS_FILE, index=False)
+                storage.delete_insight(selected_company)
                 st.success(f"✅ Notes for {selected_company} have been deleted.")
                 st.rerun()
     else:
         st.info("No saved improvement or preservation notes found.")
 
 # --- Feedback CSV Analysis Page ---
+FEEDBACK_PREVIEW_ROWS = 200
+
 if st.session_state.current_page == "feedback":
     st.header("💬 Feedback CSV Analysis")
     uploaded_file = st.file_uploader("Upload a CSV file with 'feedback' column", type=["csv"])
     if uploaded_file is not None:
-        df = pd.read_csv(uploaded_file)
-        if "feedback" not in df.columns:
+        import pandas as pd
+
+        # The upload is copied to disk once; reruns reuse its run directory
+        upload_key = (uploaded_file.name, uploaded_file.size)
+        if st.session_state.get("feedback_upload") != upload_key:
+            st.session_state["feedback_run_dir"] = stage_upload(uploaded_file)
+            st.session_state["feedback_upload"] = upload_key
+        run_dir = st.session_state["feedback_run_dir"]
+        input_path = os.path.join(run_dir, "input.csv")
+        output_path = os.path.join(run_dir, "classified.csv")
+
+        if "feedback" not in pd.read_csv(input_path, nrows=0).columns:
             st.error("The CSV must contain a 'feedback' column.")
         else:
-            if st.button("Classify Feedback"):
-                with st.spinner("Classifying feedback, please wait..."):
-                    df["category"] = df["feedback"].apply(classify_feedback)
-                    st.dataframe(df)
-                    st.download_button(
-                        "📥 Download Classified CSV",
-                        df.to_csv(index=False).encode("utf-8"),
-                        "classified_feedback.csv",
-                        "text/csv"
-                    )
+            feedback_job = jobs.get_job(st.session_state["feedback_job"]) if st.session_state.get("feedback_job") else None
+            feedback_running = feedback_job is not None and feedback_job["status"] in ("queued", "running")
+            checkpoint = read_checkpoint(output_path)
+            complete = bool(checkpoint and checkpoint["complete"])
+
+            if checkpoint and not complete and not feedback_running:
+                st.info(f"⏸ A previous run stopped after {checkpoint['rows']} rows. Classifying resumes from there.")
+            if not feedback_running and not complete and st.button("Classify Feedback"):
+                st.session_state["feedback_job"] = jobs.submit_job(
+                    "feedback", run_feedback_job, input_path, output_path, label=f"Classifying {uploaded_file.name}"
+                )
+                st.rerun()
+
+            if feedback_job is not None:
+                if feedback_job["status"] == "failed":
+                    st.error(f"{feedback_job['error']} Progress up to the last finished chunk is kept.")
+                    del st.session_state["feedback_job"]
+                elif feedback_job["status"] == "done":
+                    del st.session_state["feedback_job"]
+                else:
+                    fraction = feedback_job["done"] / feedback_job["total"] if feedback_job["total"] else 0.0
+                    rows = checkpoint["rows"] if checkpoint else 0
+                    st.progress(min(1.0, fraction), text=f"Classified {rows} rows ({fraction:.0%} of the file)")
+
+            # Only the first rows are loaded, however large the output has grown
+            if checkpoint and checkpoint["rows"]:
+                st.dataframe(pd.read_csv(output_path, nrows=FEEDBACK_PREVIEW_ROWS))
+                if checkpoint["rows"] > FEEDBACK_PREVIEW_ROWS:
+                    st.caption(f"Showing the first {FEEDBACK_PREVIEW_ROWS} of {checkpoint['rows']} classified rows.")
+            model = feedback_model.load_model()
+            if model and model.report.get("holdout"):
+                report, counts = model.report, feedback_model.counters()
+                confident = (f", {report['confident_agreement']:.0%} on the {report['confident_share']:.0%} it labels itself"
+                             if report["confident_agreement"] is not None else "")
+                st.caption(
+                    f"🧠 Local model trained on {report['trained_on']} LLM labels agrees with the LLM on "
+                    f"{report['agreement']:.0%} of {report['holdout']} held-out rows{confident}. "
+                    f"{counts['local']} rows labelled locally, {counts['fallback']} sent to the LLM."
+                    + ("" if feedback_model.is_trusted(model) else
+                       f" It is not used below {feedback_model.FEEDBACK_MODEL_MIN_AGREEMENT:.0%} agreement.")
+                )
+            if complete:
+                with open(output_path, "rb") as f:
+                    st.download_button("📥 Download Classified CSV", f, "classified_feedback.csv", "text/csv")
+
+            if feedback_running:
+                time.sleep(JOB_POLL_SECONDS)
+                st.rerun()
@@ -0,0 +1,102 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# --- Cache settings (override through the environment) ---
+ARTICLE_CACHE_FILE = os.getenv("ARTICLE_CACHE_FILE", "article_cache.db")
+ARTICLE_CACHE_TTL = int(os.getenv("ARTICLE_CACHE_TTL", str(6 * 3600)))  # seconds before revalidating
+
+# Query parameters that only track the visitor and never change the page content
+_TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src"}
+
+_lock = threading.Lock()
+_url_locks = {}
+_conn = None
+
+
+def _get_conn():
+    """Open the article cache database once per process."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(ARTICLE_CACHE_FILE, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                url_key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                data TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        _conn.commit()
+    return _conn
+
+
+def normalize_url(url):
+    """Reduce a URL to a canonical form so trivially different links share one entry."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    path = parts.path.rstrip("/") or "/"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    )
+    # http and https copies of a page are the same article
+    return urlunsplit(("https" if scheme == "http" else scheme, host, path, urlencode(query), ""))
+
+
+def url_lock(url):
+    """Return a per-URL lock so concurrent sessions download a page only once."""
+    key = normalize_url(url)
+    with _lock:
+        return _url_locks.setdefault(key, threading.Lock())
+
+
+def get(url):
+    """Return the cache entry for url as a dict, or None if it was never fetched."""
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT data, etag, last_modified, fetched_at FROM articles WHERE url_key = ?",
+            (normalize_url(url),)
+        ).fetchone()
+    if row is None:
+        return None
+    data, etag, last_modified, fetched_at = row
+    return {
+        "data": json.loads(data),
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": fetched_at,
+        "fresh": time.time() - fetched_at < ARTICLE_CACHE_TTL,
+    }
+
+
+def put(url, data, etag=None, last_modified=None):
+    """Store the extracted article for url along with its validators."""
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO articles (url_key, url, data, etag, last_modified, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (normalize_url(url), url, json.dumps(data, ensure_ascii=False), etag, last_modified, time.time())
+        )
+        conn.commit()
+
+
+def touch(url):
+    """Mark a cached entry as fresh again after a 304 Not Modified response."""
+    with _lock:
+        conn = _get_conn()
+        conn.execute("UPDATE articles SET fetched_at = ? WHERE url_key = ?", (time.time(), normalize_url(url)))
+        conn.commit()
@@ -0,0 +1,244 @@
+"""Headless batch runner for the analysis pipeline.
+
+Reads a JSONL or CSV file of items (each with a "url" or "text" field, and
+optionally "id" and "company"), analyzes them in a worker pool and appends one
+JSON line per item to the output file. The output doubles as the checkpoint:
+re-running with the same output skips every item that already succeeded.
+
+Usage:
+    python batch.py articles.jsonl -o results.jsonl --workers 4 [--save-history]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from core import ANALYSIS_REUSE_MAX_AGE, run_analysis_pipeline
+import telemetry
+
+STAGES = ["fetch", "download", "parse", "identify", "dedupe", "chunk", "analyze", "map", "reduce", "summary"]
+
+
+def read_items(path):
+    """Yield input items as dicts from a .jsonl or .csv file."""
+    if path.lower().endswith(".csv"):
+        csv.field_size_limit(sys.maxsize)
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield {k: v for k, v in row.items() if v}
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    print(f"❌ Skipping invalid JSON on line {line_no}")
+
+
+def item_id(item):
+    """Stable id for an item: its own id, its URL, or a hash of its text."""
+    if item.get("id"):
+        return str(item["id"])
+    if item.get("url"):
+        return item["url"]
+    return hashlib.sha256(item.get("text", "").encode("utf-8")).hexdigest()[:16]
+
+
+def load_checkpoint(output_path):
+    """Return the ids already completed successfully in a previous run."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash; the item is simply redone
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers: the smallest value with pct% of them at or below it.
+
+    >>> percentile([7], 50), percentile([7], 95)
+    (7, 7)
+    >>> percentile([1, 2], 50), percentile([1, 2], 95)
+    (1, 2)
+    >>> percentile(list(range(1, 21)), 50), percentile(list(range(1, 21)), 95)
+    (10, 19)
+    >>> percentile(list(range(1, 101)), 50), percentile(list(range(1, 101)), 95)
+    (50, 95)
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    # pct * n before dividing keeps exact ranks exact (0.07 * 100 is not quite 7 in floating point)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100) - 1))
+    return ordered[index]
+
+
+class ResultWriter:
+    """Appends result lines durably so a crash loses at most the item in flight."""
+
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def process_item(item, save_history=False, incremental=True):
+    """Run the pipeline on one item and return its output record."""
+    source = item.get("url") or item.get("text", "")
+    start = time.perf_counter()
+    try:
+        # Near-duplicates are only answered from fresh stored analyses
+        result = run_analysis_pipeline(
+            source, company_name=item.get("company"), reuse_max_age=ANALYSIS_REUSE_MAX_AGE,
+            incremental=incremental, save=save_history
+        )
+    except Exception as e:
+        return {"id": item_id(item), "status": "error", "error": str(e),
+                "seconds": time.perf_counter() - start}
+    return {
+        "id": item_id(item),
+        "status": "ok",
+        "company": result["company"],
+        "analysis": result["analysis"],
+        "summary": result["summary"],
+        "parts": result["parts"],
+        "new_parts": result["new_parts"],
+        "duplicate_of": result["duplicate_of"],
+        "timings": result["timings"],
+        "tokens": {field: result["telemetry"][field] for field in telemetry.USAGE_FIELDS},
+        "llm_calls": result["telemetry"]["calls"],
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def run_batch(input_path, output_path, workers=4, save_history=False, incremental=True, progress_every=10):
+    """Process every unfinished item in input_path and return throughput statistics."""
+    done_ids = load_checkpoint(output_path)
+    items = []
+    seen = set(done_ids)
+    for item in read_items(input_path):
+        if not (item.get("url") or item.get("text")):
+            continue
+        key = item_id(item)
+        if key not in seen:
+            seen.add(key)
+            items.append(item)
+    print(f"▶ {len(items)} item(s) to process, {len(done_ids)} already done")
+
+    writer = ResultWriter(output_path)
+    stage_times = {stage: [] for stage in STAGES}
+    item_times = []
+    tokens = {field: 0 for field in telemetry.USAGE_FIELDS}
+    failures = 0
+    duplicates = 0
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(process_item, item, save_history, incremental) for item in items]
+            for count, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                writer.write(record)
+                if record["status"] == "ok":
+                    item_times.append(record["seconds"])
+                    for stage, seconds in record["timings"].items():
+                        stage_times.setdefault(stage, []).append(seconds)
+                    for field, value in record["tokens"].items():
+                        tokens[field] += value
+                    if record["duplicate_of"]:
+                        duplicates += 1
+                else:
+                    failures += 1
+                    print(f"❌ {record['id']}: {record['error']}")
+                if count % progress_every == 0 or count == len(items):
+                    elapsed = time.perf_counter() - started
+                    print(f"✅ {count}/{len(items)} done, {count / elapsed * 60:.1f} items/min")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "items": len(items),
+        "succeeded": len(items) - failures,
+        "failed": failures,
+        "skipped": len(done_ids),
+        "near_duplicates": duplicates,
+        "elapsed_seconds": elapsed,
+        "items_per_minute": len(items) / elapsed * 60 if elapsed else 0.0,
+        "item_latency": {"p50": percentile(item_times, 50), "p95": percentile(item_times, 95)},
+        "tokens": tokens,
+        "stage_latency": {
+            stage: {"p50": percentile(times, 50), "p95": percentile(times, 95), "count": len(times)}
+            for stage, times in stage_times.items() if times
+        },
+    }
+    return stats
+
+
+def print_stats(stats):
+    print(f"\n{stats['succeeded']} succeeded, {stats['failed']} failed, {stats['skipped']} skipped "
+          f"in {stats['elapsed_seconds']:.1f}s ({stats['items_per_minute']:.1f} items/min)")
+    print(f"{'stage':<10} {'p50 s':>8} {'p95 s':>8} {'n':>6}")
+    for stage, values in stats["stage_latency"].items():
+        print(f"{stage:<10} {values['p50']:>8.2f} {values['p95']:>8.2f} {values['count']:>6}")
+    if stats["item_latency"]["p50"] is not None:
+        print(f"{'item':<10} {stats['item_latency']['p50']:>8.2f} {stats['item_latency']['p95']:>8.2f}")
+    tokens = stats["tokens"]
+    print(f"tokens: {tokens['prompt_tokens']} prompt ({tokens['cached_tokens']} cached), "
+          f"{tokens['completion_tokens']} completion")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run competitor analyses in bulk, resumably.")
+    parser.add_argument("input", help="JSONL or CSV file with url or text per item")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL results / checkpoint file")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="items processed in parallel")
+    parser.add_argument("--save-history", action="store_true", help="also save analyses to the app history")
+    parser.add_argument("--replace", action="store_true",
+                        help="replace each company's stored analysis instead of merging new articles into it")
+    # Merging is the default now; the old flag is still accepted
+    parser.add_argument("--incremental", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--stats", help="write throughput statistics as JSON to this file")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    telemetry.start_metrics_server(args.metrics_port)
+    stats = run_batch(args.input, args.output, workers=args.workers, save_history=args.save_history,
+                      incremental=not args.replace)
+    print_stats(stats)
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Microbenchmark: core.chunk_text against the original split_text.
+
+Usage: python benchmarks/bench_chunker.py [--sizes 1 2 4] [--repeat 3]
+Sizes are in megabytes of generated article-like text.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from core import chunk_text  # noqa: E402
+
+WORDS = (
+    "the company revenue growth market customers platform strategy product launch "
+    "investors partnership quarter enterprise cloud retail pricing competitors analysts "
+    "Acme Globex Initech Umbrella expansion subscription margin operations"
+).split()
+
+
+def legacy_split_text(text, max_length=3000):
+    """The original split_text, kept here as the baseline."""
+    words = text.split()
+    parts = []
+    current_part = []
+    for word in words:
+        current_part.append(word)
+        if len(" ".join(current_part)) > max_length:
+            parts.append(" ".join(current_part))
+            current_part = []
+    if current_part:
+        parts.append(" ".join(current_part))
+    return parts
+
+
+def make_text(size_bytes, seed=0):
+    """Generate sentences and paragraphs until the text reaches size_bytes."""
+    rng = random.Random(seed)
+    pieces = []
+    total = 0
+    while total < size_bytes:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 35))).capitalize()
+        sentence += rng.choice([". ", ". ", "! ", "? ", ".\n\n"])
+        pieces.append(sentence)
+        total += len(sentence)
+    return "".join(pieces)
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2, 4], help="input sizes in MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'legacy s':>10} {'chunk_text s':>13} {'speed-up':>9} {'legacy parts':>13} {'chunks':>7}")
+    for size in args.sizes:
+        text = make_text(int(size * 1024 * 1024))
+        legacy_time, legacy_parts = best_of(lambda: legacy_split_text(text), args.repeat)
+        new_time, chunks = best_of(lambda: chunk_text(text, max_tokens=750), args.repeat)
+        print(f"{size:>6.1f}MB {legacy_time:>10.3f} {new_time:>13.3f} {legacy_time / new_time:>8.1f}x "
+              f"{len(legacy_parts):>13} {len(chunks):>7}")
+
+
+if __name__ == "__main__":
+    main()
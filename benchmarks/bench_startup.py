@@ -0,0 +1,100 @@
+"""Cold-start benchmark: module import time and first paint of app.py.
+
+Each import is measured in a fresh interpreter so nothing is already cached.
+First paint runs app.py once with Streamlit's AppTest harness; that includes
+the script's imports and its first render. Use the --max-* options in CI to
+fail when startup regresses.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5] [--max-import-ms 300] [--max-paint-ms 1500]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+print((time.perf_counter() - start) * 1000)
+"""
+
+PAINT_SNIPPET = """
+import os, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=60).run()
+elapsed = (time.perf_counter() - start) * 1000
+assert not at.exception, at.exception
+print(elapsed)
+"""
+
+# Modules the app itself should not import on a cold start
+DEFERRED_MODULES = ["openai", "httpx", "newspaper", "trafilatura", "lxml", "pandas", "requests", "numpy"]
+
+LOADED_SNIPPET = """
+import sys, json
+from streamlit.testing.v1 import AppTest
+already_loaded = set(sys.modules)
+AppTest.from_file("app.py", default_timeout=60).run()
+print(json.dumps([m for m in {modules!r} if m in sys.modules and m not in already_loaded]))
+"""
+
+
+def run_snippet(code, cwd):
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "sk-benchmark"))
+    out = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env,
+                         capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+def median_ms(code, cwd, repeat):
+    return statistics.median(float(run_snippet(code, cwd)) for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, help="fail if importing core exceeds this")
+    parser.add_argument("--max-paint-ms", type=float, help="fail if the first run of app.py exceeds this")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for module in ["core", "storage", "llm_client"]:
+        results[f"import_{module}_ms"] = median_ms(IMPORT_SNIPPET.format(module=module), ROOT, args.repeat)
+
+    # Point the app's databases at a scratch directory so the developer's own
+    # history and caches are not touched
+    with tempfile.TemporaryDirectory() as scratch:
+        for name in ("HISTORY_DB_FILE", "LLM_CACHE_FILE", "ARTICLE_CACHE_FILE"):
+            os.environ[name] = os.path.join(scratch, f"{name.lower()}.db")
+        results["first_paint_ms"] = median_ms(PAINT_SNIPPET, ROOT, args.repeat)
+        results["eagerly_loaded"] = json.loads(run_snippet(LOADED_SNIPPET.format(modules=DEFERRED_MODULES), ROOT))
+
+    for name, value in results.items():
+        print(f"{name:<22} {value:.1f}" if isinstance(value, float) else f"{name:<22} {value}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    failed = False
+    if args.max_import_ms and results["import_core_ms"] > args.max_import_ms:
+        print(f"❌ import core took {results['import_core_ms']:.1f} ms (limit {args.max_import_ms})")
+        failed = True
+    if args.max_paint_ms and results["first_paint_ms"] > args.max_paint_ms:
+        print(f"❌ first paint took {results['first_paint_ms']:.1f} ms (limit {args.max_paint_ms})")
+        failed = True
+    if results["eagerly_loaded"]:
+        print(f"❌ heavy modules imported at startup: {', '.join(results['eagerly_loaded'])}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
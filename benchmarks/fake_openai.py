@@ -0,0 +1,218 @@
+"""A local stand-in for the OpenAI chat completions endpoint.
+
+Answers POST /v1/chat/completions (plain and stream=True) with canned text
+shaped like the app's prompts expect: company names, five-section analyses,
+JSON feedback labels. Latency, rate limits and error rates are configurable so
+benchmarks can exercise the scheduler and retries without any network.
+
+Run standalone:  python benchmarks/fake_openai.py --port 8765 --latency 0.2
+Then point the app at it:  OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORIES = ["Bug", "Feature Request", "User Interface", "Other"]
+
+ANALYSIS_TEXT = """1. Company Overview
+The company described in the text. Not specified beyond the provided details.
+
+2. Unique Selling Points (USP)
+Not specified.
+
+3. Target Market & Customers
+Not specified.
+
+4. Strategic Positioning
+Not specified.
+
+5. Potential Risks / Challenges
+Not specified."""
+
+
+class FakeSettings:
+    """Behaviour knobs shared by all request handlers."""
+
+    def __init__(self, latency=0.0, jitter=0.0, tokens_per_second=0.0, rpm=0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = []
+        self.counts = {"requests": 0, "rate_limited": 0, "errors": 0, "streamed": 0}
+
+    def admit(self):
+        """Return None to serve the request, or an (status, retry_after) rejection."""
+        now = time.monotonic()
+        with self.lock:
+            self.counts["requests"] += 1
+            if self.rpm:
+                self.window = [t for t in self.window if now - t < 60]
+                if len(self.window) >= self.rpm:
+                    self.counts["rate_limited"] += 1
+                    return 429, max(0.1, 60 - (now - self.window[0]))
+                self.window.append(now)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.counts["errors"] += 1
+                return 500, None
+        return None
+
+    def delay(self):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + extra
+
+
+def reply_for(messages):
+    """Produce a plausible answer for the app's prompts."""
+    prompt = messages[-1].get("content", "") if messages else ""
+    if "Feedback items:" in prompt:
+        items = json.loads(prompt.split("Feedback items:", 1)[1].strip())
+        results = [{"id": item["id"], "category": _category(item["feedback"])} for item in items]
+        return json.dumps({"results": results})
+    if "Return a JSON object with these string keys" in prompt:
+        sections = dict(re.findall(r"^\d\. ([^\n]+)\n([^\n]+)", ANALYSIS_TEXT, re.MULTILINE))
+        keys = re.findall(r'"(\w+)"', prompt.split("string keys:", 1)[1].split("\n", 1)[0])
+        values = list(sections.values())
+        result = {key: values[i] if i < len(values) else "Not specified." for i, key in enumerate(keys)}
+        result["summary"] = "The company focuses on its core market; most details are not specified in the source."
+        return json.dumps(result)
+    if "Classify the following user feedback" in prompt:
+        return _category(prompt)
+    if "company name" in prompt.lower():
+        match = re.search(r"\b([A-Z][a-z]+(?: [A-Z][a-z]+)?)\b", prompt.split("Text:", 1)[-1])
+        return match.group(1) if match else "Acme"
+    if "Summarize" in prompt:
+        return "The company focuses on its core market; most details are not specified in the source."
+    if "Compare these two companies" in prompt:
+        return "1. Target Market\nBoth: not specified.\n\n5. Summary\nThe two companies are broadly similar."
+    return ANALYSIS_TEXT
+
+
+def _category(text):
+    lowered = text.lower()
+    if any(word in lowered for word in ("crash", "error", "broken", "bug")):
+        return "Bug"
+    if any(word in lowered for word in ("add", "wish", "would like", "feature")):
+        return "Feature Request"
+    if any(word in lowered for word in ("button", "color", "layout", "screen")):
+        return "User Interface"
+    return "Other"
+
+
+def make_handler(settings):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+            rejection = settings.admit()
+            if rejection:
+                status, retry_after = rejection
+                headers = {"Retry-After": f"{retry_after:.2f}"} if retry_after else None
+                message = "Rate limit reached" if status == 429 else "Internal server error"
+                self._send_json(status, {"error": {"message": message, "type": "fake"}}, headers)
+                return
+
+            time.sleep(settings.delay())
+            text = reply_for(request.get("messages", []))
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4
+            completion_tokens = max(1, len(text) // 4)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request.get("model", "fake")}
+
+            if request.get("stream"):
+                with settings.lock:
+                    settings.counts["streamed"] += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                per_token = 1 / settings.tokens_per_second if settings.tokens_per_second else 0
+                for piece in re.findall(r"\S+\s*|\s+", text):
+                    chunk = dict(base, object="chat.completion.chunk", choices=[
+                        {"index": 0, "delta": {"content": piece}, "finish_reason": None}
+                    ])
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if per_token:
+                        time.sleep(per_token)
+                done = dict(base, object="chat.completion.chunk", choices=[
+                    {"index": 0, "delta": {}, "finish_reason": "stop"}
+                ])
+                self.wfile.write(f"data: {json.dumps(done)}\n\n".encode("utf-8"))
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    usage_chunk = dict(base, object="chat.completion.chunk", choices=[], usage=usage)
+                    self.wfile.write(f"data: {json.dumps(usage_chunk)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+                return
+
+            if settings.tokens_per_second:
+                time.sleep(completion_tokens / settings.tokens_per_second)
+            self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+            ]))
+
+    return Handler
+
+
+def start_server(port=0, **settings_kwargs):
+    """Start the fake API in a background thread; returns (server, settings, base_url)."""
+    settings = FakeSettings(**settings_kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(settings))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, settings, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="generation speed, 0 for instant")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    args = parser.parse_args()
+    server, _, base_url = start_server(
+        args.port, latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+        rpm=args.rpm, error_rate=args.error_rate
+    )
+    print(f"Fake OpenAI API listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Generated fixture articles served from a local HTTP server.
+
+The server supports ETag / Last-Modified so the article cache's conditional
+requests are exercised the same way as against a real site.
+"""
+import hashlib
+import random
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises", "Soylent"]
+
+# Article sizes in words
+SIZES = {"small": 400, "medium": 2500, "large": 12000, "huge": 60000}
+
+_VOCABULARY = (
+    "platform customers revenue growth market enterprise subscription pricing launch partners "
+    "retail cloud analytics strategy expansion margin competitors investors operations product "
+    "quarter region demand supply logistics brand loyalty premium segment channel"
+).split()
+
+
+def generate_article(company, words, seed=0):
+    """Return (title, html) for an article of roughly `words` words about company."""
+    rng = random.Random(f"{company}-{words}-{seed}")
+    title = f"{company} announces new {rng.choice(_VOCABULARY)} strategy"
+    paragraphs = []
+    written = 0
+    while written < words:
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            body = " ".join(rng.choice(_VOCABULARY) for _ in range(rng.randint(8, 24)))
+            subject = company if rng.random() < 0.3 else "The company"
+            sentences.append(f"{subject} {body}.")
+        paragraph = " ".join(sentences)
+        written += len(paragraph.split())
+        paragraphs.append(f"<p>{paragraph}</p>")
+    html = (
+        "<!DOCTYPE html><html><head>"
+        f"<title>{title} | Fixture News</title>"
+        '<meta property="og:site_name" content="Fixture News">'
+        f'<meta property="og:title" content="{title}">'
+        "</head><body><header><nav>Home | Business | Tech</nav></header>"
+        f"<article><h1>{title}</h1>{''.join(paragraphs)}</article>"
+        "<footer>© Fixture News</footer></body></html>"
+    )
+    return title, html
+
+
+def build_fixtures(companies=COMPANIES, sizes=SIZES):
+    """Map URL paths to HTML for every company and size."""
+    pages = {}
+    for company in companies:
+        slug = company.lower().replace(" ", "-")
+        for size_name, words in sizes.items():
+            _, html = generate_article(company, words)
+            pages[f"/{slug}/{size_name}"] = html
+    return pages
+
+
+def start_fixture_server(pages, port=0):
+    """Serve pages in a background thread; returns (server, base_url, counters)."""
+    last_modified = formatdate(usegmt=True)
+    etags = {path: '"' + hashlib.md5(html.encode("utf-8")).hexdigest() + '"' for path, html in pages.items()}
+    counters = {"requests": 0, "not_modified": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            with lock:
+                counters["requests"] += 1
+            if path not in pages:
+                self.send_error(404)
+                return
+            if self.headers.get("If-None-Match") == etags[path]:
+                with lock:
+                    counters["not_modified"] += 1
+                self.send_response(304)
+                self.send_header("ETag", etags[path])
+                self.end_headers()
+                return
+            body = pages[path].encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etags[path])
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", counters
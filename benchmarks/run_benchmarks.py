@@ -0,0 +1,229 @@
+"""Offline benchmark suite for the analysis pipeline.
+
+Starts the fake OpenAI server and the fixture article server on localhost,
+points the app modules at them and at scratch databases, and times these
+scenarios:
+
+  single_analysis   fetch → chunk → map → reduce → summary per article size, cold and warm
+  compare           two-company comparison, cold and warm
+  identify          company-name detection per fixture article (article already cached)
+  feedback_csv      batched classification of a feedback export with duplicates
+  history_load      history listing, search and lookup with 10k+ stored analyses
+
+Results are printed and written as JSON so runs can be diffed over time.
+No network access is needed.
+
+Usage: python benchmarks/run_benchmarks.py [--output bench.json] [--latency 0.2] [--rpm 0]
+       [--scenarios single_analysis compare] [--history-records 10000] [--feedback-rows 2000]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+SCENARIOS = ["single_analysis", "compare", "identify", "feedback_csv", "history_load"]
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def requests_made(settings, before):
+    return settings.counts["requests"] - before
+
+
+def bench_single_analysis(ctx):
+    core, settings, base_url = ctx["core"], ctx["settings"], ctx["articles_url"]
+    results = {}
+    for size in ctx["sizes"]:
+        url = f"{base_url}/acme/{size}"
+        row = {}
+        for run in ("cold", "warm"):
+            before = settings.counts["requests"]
+            seconds, result = timed(core.run_analysis_pipeline, url, "Acme")
+            row[run] = {
+                "seconds": round(seconds, 4),
+                "llm_requests": requests_made(settings, before),
+                "parts": result["parts"],
+                "stages": {stage: round(value, 4) for stage, value in result["timings"].items()},
+            }
+        results[size] = row
+    return results
+
+
+def bench_compare(ctx):
+    core, settings, base_url = ctx["core"], ctx["settings"], ctx["articles_url"]
+    url1, url2 = f"{base_url}/globex/medium", f"{base_url}/initech/medium"
+    results = {}
+    for run in ("cold", "warm"):
+        before = settings.counts["requests"]
+        seconds, _ = timed(core.run_compare_pipeline, url1, "Globex", url2, "Initech")
+        results[run] = {"seconds": round(seconds, 4), "llm_requests": requests_made(settings, before)}
+    return results
+
+
+def bench_identify(ctx):
+    core, settings, base_url = ctx["core"], ctx["settings"], ctx["articles_url"]
+    from fixtures import COMPANIES
+    urls = {company: f"{base_url}/{company.lower().replace(' ', '-')}/medium" for company in COMPANIES}
+    for url in urls.values():
+        core.fetch_article(url)
+    before = settings.counts["requests"]
+    timings = []
+    correct = 0
+    for company, url in urls.items():
+        seconds, name = timed(core.extract_company_name, url)
+        timings.append(seconds)
+        correct += name == company
+    timings.sort()
+    return {
+        "articles": len(urls),
+        "correct": correct,
+        "median_ms": round(timings[len(timings) // 2] * 1000, 3),
+        "llm_requests": requests_made(settings, before),
+    }
+
+
+def bench_feedback_csv(ctx):
+    feedback, settings = ctx["feedback"], ctx["settings"]
+    rng = random.Random(1)
+    templates = [
+        "The app crashes when I open settings {n}",
+        "Please add dark mode {n}",
+        "The save button is hard to find",
+        "Love it",
+        "Export is broken since the update {n}",
+        "I wish I could share reports with my team",
+    ]
+    rows = [rng.choice(templates).format(n=rng.randint(0, ctx["feedback_rows"] // 20))
+            for _ in range(ctx["feedback_rows"])]
+    before = settings.counts["requests"]
+    seconds, labels = timed(feedback.classify_feedback_batch, rows)
+    # A second export with unseen texts shows how much the local model takes over
+    fresh = [rng.choice(templates).format(n=rng.randint(ctx["feedback_rows"], 2 * ctx["feedback_rows"]))
+             for _ in range(ctx["feedback_rows"])]
+    before_fresh = settings.counts["requests"]
+    fresh_seconds, _ = timed(feedback.classify_feedback_batch, fresh)
+    return {
+        "rows": len(rows),
+        "unique_rows": len({feedback.normalize_feedback(r) for r in rows}),
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(len(rows) / seconds, 1) if seconds else None,
+        "llm_requests": requests_made(settings, before),
+        "labels": {c: labels.count(c) for c in feedback.CATEGORIES},
+        "fresh_seconds": round(fresh_seconds, 4),
+        "fresh_llm_requests": requests_made(settings, before_fresh),
+        "local_model": feedback.feedback_model.counters(),
+    }
+
+
+def bench_history_load(ctx):
+    storage = ctx["storage"]
+    count = ctx["history_records"]
+    rng = random.Random(2)
+    words = "cloud retail pricing platform enterprise margin growth customers strategy subscription".split()
+    insert_seconds, _ = timed(lambda: [
+        storage.save_analysis(f"Company {i}", " ".join(rng.choices(words, k=200)), "summary")
+        for i in range(count)
+    ])
+    samples = {
+        "first_page": lambda: storage.list_analyses(limit=20),
+        "deep_page": lambda: storage.list_analyses(limit=20, offset=count // 2),
+        "count": storage.count_analyses,
+        "search_common": lambda: storage.search_analyses("cloud retail"),
+        "search_name": lambda: storage.search_analyses(f"Company {count // 3}"),
+        "get_one": lambda: storage.get_analysis(f"Company {count // 4}"),
+    }
+    results = {"records": count, "insert_seconds": round(insert_seconds, 3)}
+    for name, func in samples.items():
+        timings = sorted(timed(func)[0] for _ in range(20))
+        results[f"{name}_ms"] = round(timings[len(timings) // 2] * 1000, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the competitor analysis pipeline")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium", "large"])
+    parser.add_argument("--latency", type=float, default=0.2, help="fake API latency per call, seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0, help="fake API rate limit, 0 for none")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--history-records", type=int, default=10000)
+    parser.add_argument("--feedback-rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    from fake_openai import start_server
+    from fixtures import build_fixtures, start_fixture_server
+
+    api_server, settings, api_url = start_server(
+        latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+        rpm=args.rpm, error_rate=args.error_rate
+    )
+    article_server, articles_url, article_counters = start_fixture_server(build_fixtures())
+
+    with tempfile.TemporaryDirectory() as scratch:
+        # Configure the app modules before they are imported
+        os.environ.update({
+            "OPENAI_API_KEY": "sk-fake",
+            "OPENAI_BASE_URL": api_url,
+            "HISTORY_DB_FILE": os.path.join(scratch, "history.db"),
+            "LLM_CACHE_FILE": os.path.join(scratch, "llm_cache.db"),
+            "ARTICLE_CACHE_FILE": os.path.join(scratch, "article_cache.db"),
+            "FEEDBACK_MODEL_FILE": os.path.join(scratch, "feedback_model.npz"),
+        })
+        import core
+        import feedback
+        import storage
+        import llm_client
+
+        llm_client.init_client("sk-fake", base_url=api_url)
+        ctx = {
+            "core": core, "feedback": feedback, "storage": storage, "settings": settings,
+            "articles_url": articles_url, "sizes": args.sizes,
+            "history_records": args.history_records, "feedback_rows": args.feedback_rows,
+        }
+        runners = {
+            "single_analysis": bench_single_analysis,
+            "compare": bench_compare,
+            "identify": bench_identify,
+            "feedback_csv": bench_feedback_csv,
+            "history_load": bench_history_load,
+        }
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "settings": {k: v for k, v in vars(args).items() if k != "output"},
+            "scenarios": {},
+        }
+        for name in args.scenarios:
+            print(f"▶ {name}")
+            seconds, result = timed(runners[name], ctx)
+            result_entry = {"total_seconds": round(seconds, 3), "result": result}
+            report["scenarios"][name] = result_entry
+            print(json.dumps(result_entry, indent=2))
+        report["fake_api"] = dict(settings.counts)
+        report["fixture_server"] = dict(article_counters)
+        report["scheduler"] = llm_client.stats()
+
+    api_server.shutdown()
+    article_server.shutdown()
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
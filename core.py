@@ -1,92 +1,322 @@
-import time
 import re
 import os
+import hashlib
+import json
+import threading
+import time
+import contextvars
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
-from openai import OpenAI
-from newspaper import Article
+import article_cache
+import extractors
+import fingerprint
+import name_heuristics
+import llm_cache
+import llm_client
+import storage
+import telemetry
+
+# Upper bound on concurrent GPT calls for the map phase
+MAX_CONCURRENT_CALLS = int(os.getenv("MAX_CONCURRENT_CALLS", "4"))
+
+# Maximum number of partial analyses merged in one prompt
+COMBINE_FAN_IN = int(os.getenv("COMBINE_FAN_IN", "4"))
+
+# Stored analyses of the same company and source younger than this are reused
+ANALYSIS_REUSE_MAX_AGE = int(os.getenv("ANALYSIS_REUSE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Articles at least this similar (0-1) to one already analyzed reuse its analysis; 0 disables
+NEAR_DUPLICATE_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_SIMILARITY", "0.9"))
 
-client = None
+# Times a merge is redone when another process saved the same company's analysis meanwhile
+MERGE_ATTEMPTS = 3
+
+_company_locks = {}
+_company_locks_lock = threading.Lock()
+
+# Inputs that fit in one chunk are analyzed and summarized in a single call
+FUSED_ANALYSIS = os.getenv("FUSED_ANALYSIS", "1") != "0"
+
+# Characters of the article sent to GPT when the name heuristics are not confident
+COMPANY_NAME_LEAD_CHARS = 1500
+
+# Sent with article downloads; timeouts and size limits live in extractors.py
+USER_AGENT = "Mozilla/5.0 (compatible; CompetitorAnalysisTool/1.0)"
 
 def init_client(api_key):
-    """Initialize the OpenAI client."""
-    global client
-    client = OpenAI(api_key=api_key)
+    """Initialize the shared OpenAI client."""
+    llm_client.init_client(api_key)
+
+def chat_completion(messages, model="gpt-4o-mini", temperature=None, **params):
+    """Run a chat completion through the on-disk cache and return the reply text."""
+    key = llm_cache.make_key(model, messages, temperature, **params)
+    with telemetry.llm_call(model) as call:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            call.cache_hit = True
+            return cached
+        if temperature is not None:
+            params["temperature"] = temperature
+        with telemetry.counting_retries(call):
+            response = llm_client.create_chat_completion(model=model, messages=messages, **params)
+        call.usage = response.usage
+    content = response.choices[0].message.content.strip()
+    llm_cache.put(key, content, model=model)
+    return content
+
+def stream_chat_completion(messages, model="gpt-4o-mini", temperature=None, **params):
+    """Yield the reply text as it is generated; the complete reply is cached like chat_completion."""
+    key = llm_cache.make_key(model, messages, temperature, **params)
+    with telemetry.llm_call(model, stream=True) as call:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            call.cache_hit = True
+            yield cached
+            return
+        if temperature is not None:
+            params["temperature"] = temperature
+        with telemetry.counting_retries(call):
+            stream = llm_client.create_chat_completion(
+                model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **params
+            )
+        pieces = []
+        for chunk in stream:
+            # With include_usage the last chunk carries the token counts and no choices
+            if getattr(chunk, "usage", None):
+                call.usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                call.first_token()
+                pieces.append(delta)
+                yield delta
+    llm_cache.put(key, "".join(pieces).strip(), model=model)
+
+def fetch_article(url):
+    """Fetch and parse an article, reusing the shared on-disk cache.
+
+    Fresh entries are returned without touching the network. Stale entries are
+    revalidated with ETag / Last-Modified so unchanged pages are not parsed again.
+    """
+    with article_cache.url_lock(url):
+        cached = article_cache.get(url)
+        if cached and cached["fresh"]:
+            return cached["data"]
+
+        headers = {"User-Agent": USER_AGENT}
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        with telemetry.span("download"):
+            response, body = extractors.download(url, headers)
+        if response.status_code == 304:
+            if cached:
+                article_cache.touch(url)
+                return cached["data"]
+            raise extractors.FetchError("Server answered 304 Not Modified to an unconditional request")
+
+        with telemetry.span("parse"):
+            data = extractors.extract(body, url, response)
+        article_cache.put(
+            url, data,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified")
+        )
+        return data
+
+def format_article(article):
+    """Combine title and text for better context."""
+    return f"Title: {article['title']}\n\nContent: {article['text']}"
 
 def get_article_text(url):
     """Fetch article content from a URL."""
     try:
-        article = Article(url)
-        article.download()
-        article.parse()
-        
-        # Get both text and title for better company name extraction
-        text = article.text.strip()
-        title = article.title.strip() if article.title else ""
-        
-        # Combine title and text for better context
-        full_content = f"Title: {title}\n\nContent: {text}"
-        return full_content
+        return format_article(fetch_article(url))
     except Exception as e:
         print(f"❌ Failed to fetch article: {e}")
         return ""
 
-def split_text(text, max_length=3000):
-    """Split text into parts for analysis."""
-    words = text.split()
-    parts = []
-    current_part = []
-    for word in words:
-        current_part.append(word)
-        if len(" ".join(current_part)) > max_length:
-            parts.append(" ".join(current_part))
-            current_part = []
-    if current_part:
-        parts.append(" ".join(current_part))
-    return parts
+def _fetch_article_text(url):
+    """Like get_article_text, but a failed download is raised with its reason."""
+    try:
+        return format_article(fetch_article(url))
+    except Exception as e:
+        raise ValueError(f"Could not fetch the article: {e}") from e
 
-from urllib.parse import urlparse
-import os
-from openai import OpenAI
+Chunk = namedtuple("Chunk", ["text", "start", "end", "tokens"])
 
-def extract_company_name(text_or_url):
-    """Extract company name from text or URL."""
-    if text_or_url.startswith("http"):
-        # For URLs, always extract the company name from the article content
-        # rather than trying to guess from the domain
-        article_text = get_article_text(text_or_url)
-        if article_text:
-            return _ask_gpt_for_company_name(article_text)
+# A sentence ends at . ! ? (plus closing quotes/brackets) followed by whitespace,
+# or at a full-width 。！？ which needs none; a blank line ends a paragraph
+_BOUNDARY_RE = re.compile(r"([.!?][\"')\]]*(?=\s)|[。！？][\"')\]」』”’）]*)\s*|\n\s*\n")
+_WORD_RE = re.compile(r"\S+")
+
+def _token_weight(text):
+    """Character weight used for token estimates: non-ASCII characters count double."""
+    return 2 * len(text) - len(text.encode("ascii", "ignore"))
+
+def estimate_tokens(text):
+    """Estimate the GPT token count of text without a tokenizer.
+
+    Roughly 4 ASCII characters per token; non-Latin scripts use about 2.
+    """
+    return -(-_token_weight(text) // 4)
+
+def _sentence_spans(text):
+    """Yield (start, end, ends_paragraph) for every sentence in text, in a single pass."""
+    pos = 0
+    for match in _BOUNDARY_RE.finditer(text):
+        end = match.end(1) if match.group(1) else match.start()
+        # Whitespace before a paragraph break is not a sentence
+        if end > pos and text[pos:end].strip():
+            yield pos, end, match.group(1) is None or "\n\n" in match.group(0).replace(" ", "")
+        pos = match.end()
+    if pos < len(text) and text[pos:].strip():
+        yield pos, len(text.rstrip()), True
+
+def _char_windows(text, start, end, max_tokens):
+    """Split one over-long word (such as unspaced CJK text) into character spans of at most max_tokens."""
+    budget = 4 * max_tokens
+    window_start, weight = start, 0
+    for pos in range(start, end):
+        char_weight = 1 if text[pos].isascii() else 2
+        if weight + char_weight > budget and pos > window_start:
+            yield window_start, pos
+            window_start, weight = pos, 0
+        weight += char_weight
+    yield window_start, end
+
+def _word_windows(text, start, end, max_tokens):
+    """Split one over-long sentence into word-aligned spans of at most max_tokens.
+
+    A single word over the limit is split between characters.
+    """
+    window_start = window_end = None
+    weight = 0
+    for match in _WORD_RE.finditer(text, start, end):
+        word_weight = _token_weight(match.group())
+        if -(-word_weight // 4) > max_tokens:
+            if window_start is not None:
+                yield window_start, window_end, False
+            pieces = list(_char_windows(text, match.start(), match.end(), max_tokens))
+            for piece_start, piece_end in pieces[:-1]:
+                yield piece_start, piece_end, False
+            # The last piece may still share a window with the words after it
+            window_start, window_end = pieces[-1]
+            weight = _token_weight(text[window_start:window_end])
+            continue
+        if window_start is not None and -(-(weight + 1 + word_weight) // 4) > max_tokens:
+            yield window_start, window_end, False
+            window_start = None
+        if window_start is None:
+            window_start, weight = match.start(), word_weight
         else:
-            # Fallback to domain extraction if article text is empty
-            domain = urlparse(text_or_url).netloc.replace("www.", "").lower()
-            base_name = domain.split(".")[0]
-            if base_name not in ["com", "co", "ac", "org", "net", "thebrandhopper"]:
-                return base_name.upper()
-            return "Unknown Company"
+            weight += _token_weight(text[window_end:match.start()]) + word_weight
+        window_end = match.end()
+    if window_start is not None:
+        yield window_start, window_end, True
 
-    # If user provided text instead of a link
-    return _ask_gpt_for_company_name(text_or_url)
+def chunk_text(text, max_tokens=750, overlap_tokens=0):
+    """Split text into chunks of at most max_tokens estimated tokens.
 
+    Chunks break on sentence boundaries, preferring a paragraph break when one
+    falls in the second half of the chunk. The last sentences of a chunk are
+    repeated at the start of the next one up to overlap_tokens. Runs in linear
+    time and returns Chunk(text, start, end, tokens) with offsets into text.
+    """
+    sentences = []
+    for start, end, ends_paragraph in _sentence_spans(text):
+        tokens = estimate_tokens(text[start:end])
+        if tokens <= max_tokens:
+            sentences.append((start, end, ends_paragraph, tokens))
+        else:
+            for w_start, w_end, last in _word_windows(text, start, end, max_tokens):
+                sentences.append((w_start, w_end, ends_paragraph and last, estimate_tokens(text[w_start:w_end])))
 
-def _ask_gpt_for_company_name(text):
-    """Ask GPT to extract a company name from text."""
-    api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+    chunks = []
+    current = []
+    current_tokens = 0
+    paragraph_cut = None  # index in current just after the last paragraph break
 
-    prompt = f"""
-Extract the company name from the following text or content.
-Return only the company name, nothing else.
+    def emit(upto):
+        chunk_start, chunk_end = current[0][0], current[upto - 1][1]
+        chunks.append(Chunk(text[chunk_start:chunk_end], chunk_start, chunk_end,
+                            sum(s[3] for s in current[:upto])))
 
-Content:
-{text}
-"""
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
-    return response.choices[0].message.content.strip()
+    for sentence in sentences:
+        if current and current_tokens + sentence[3] > max_tokens:
+            upto = len(current)
+            if paragraph_cut and current_tokens and \
+                    sum(s[3] for s in current[:paragraph_cut]) * 2 >= max_tokens:
+                upto = paragraph_cut
+            emit(upto)
+            carried = current[upto:]
+            # Repeat trailing sentences of the emitted chunk as overlap
+            overlap = []
+            overlap_total = 0
+            for previous in reversed(current[:upto]):
+                if overlap_total + previous[3] > overlap_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_total += previous[3]
+            current = overlap + carried
+            current_tokens = sum(s[3] for s in current)
+            # Drop overlap that would not leave room for the next sentence
+            while overlap and current_tokens + sentence[3] > max_tokens:
+                current_tokens -= overlap.pop(0)[3]
+                current.pop(0)
+            paragraph_cut = None
+        current.append(sentence)
+        current_tokens += sentence[3]
+        if sentence[2]:
+            paragraph_cut = len(current)
+    if current:
+        emit(len(current))
+    return chunks
+
+def split_text(text, max_length=3000):
+    """Split text into parts for analysis (max_length is in characters)."""
+    return [chunk.text for chunk in chunk_text(text, max_tokens=max(1, max_length // 4))]
 
+def extract_company_name(text_or_url):
+    """Extract company name from text or URL.
+
+    Title, site name and a proper-noun scan are tried first; GPT only sees the
+    lead of the article when they do not give a clear answer.
+    """
+    if text_or_url.startswith("http"):
+        try:
+            article = fetch_article(text_or_url)
+        except Exception as e:
+            print(f"❌ Failed to fetch article: {e}")
+            article = None
+        if article and article["text"]:
+            return _identify_company(
+                article["title"], article["text"], article.get("site_name", ""), text_or_url
+            )
+        # Fallback to domain extraction if article text is empty
+        domain = urlparse(text_or_url).netloc.replace("www.", "").lower()
+        base_name = domain.split(".")[0]
+        if base_name not in ["com", "co", "ac", "org", "net", "thebrandhopper"]:
+            return base_name.upper()
+        return "Unknown Company"
+
+    # If user provided text instead of a link
+    title, body = name_heuristics.split_title(text_or_url)
+    return _identify_company(title, body)
+
+def _identify_company(title, text, site_name="", url=""):
+    """Use the heuristic guess when it is confident, otherwise ask GPT about the lead."""
+    with telemetry.span("identify_heuristic"):
+        name, confident = name_heuristics.guess_company_name(title, text, site_name, url)
+    if confident:
+        return name
+    lead = text[:COMPANY_NAME_LEAD_CHARS]
+    return _ask_gpt_for_company_name(f"Title: {title}\n\n{lead}" if title else lead)
 
 def _ask_gpt_for_company_name(text):
     """Ask GPT to extract a clean company name."""
@@ -111,12 +341,12 @@ Rules:
 Text:
 {text}
 """
-    response = client.chat.completions.create(
+    name = chat_completion(
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0
     )
-    return _split_camel_case_or_concat(response.choices[0].message.content.strip())
+    return _split_camel_case_or_concat(name)
 
 def _split_camel_case_or_concat(name):
     """Ensure proper spacing for camel case or concatenated names."""
@@ -146,19 +376,100 @@ Rules:
 Text:
 {part}
 """
-    start_time = time.time()
-    response = client.chat.completions.create(
+    return chat_completion(
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are an expert business consultant who strictly uses only provided data."},
             {"role": "user", "content": prompt}
         ]
     )
-    print(f"✅ Processed part in {time.time() - start_time:.2f} sec")
-    return response.choices[0].message.content.strip()
 
-def combine_analyses(analyses):
-    """Combine multiple analyses into one."""
+# JSON keys and headings of the five analysis sections, in order
+ANALYSIS_SECTIONS = [
+    ("company_overview", "Company Overview"),
+    ("unique_selling_points", "Unique Selling Points (USP)"),
+    ("target_market", "Target Market & Customers"),
+    ("strategic_positioning", "Strategic Positioning"),
+    ("risks", "Potential Risks / Challenges"),
+]
+
+def analyze_short_text(text):
+    """Analyze and summarize text that fits in one part with a single JSON call.
+
+    Returns (analysis, summary), with the analysis formatted like the multi-stage
+    output, or None if the reply is not usable.
+    """
+    keys = ", ".join(f'"{key}" ({heading})' for key, heading in ANALYSIS_SECTIONS)
+    prompt = f"""
+You are a top-tier business consultant.
+Analyze the company described in the provided text and produce a detailed competitive analysis,
+plus one concise summary paragraph of that analysis.
+
+Return a JSON object with these string keys: {keys}, "summary".
+
+Rules:
+- Only use provided information.
+- If missing info, write: "Not specified".
+- Write in English.
+
+Text:
+{text}
+"""
+    answer = chat_completion(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "You are an expert business consultant who strictly uses only provided data."},
+            {"role": "user", "content": prompt}
+        ],
+        response_format={"type": "json_object"}
+    )
+    try:
+        result = json.loads(answer)
+    except ValueError:
+        return None
+    if not isinstance(result, dict) or not all(
+            isinstance(result.get(key), str) for key, _ in ANALYSIS_SECTIONS + [("summary", "")]):
+        return None
+    analysis = "\n\n".join(
+        f"{number}. {heading}\n{result[key].strip() or 'Not specified'}"
+        for number, (key, heading) in enumerate(ANALYSIS_SECTIONS, start=1)
+    )
+    return analysis, result["summary"].strip()
+
+def run_concurrently(func, items, max_workers=None, on_progress=None):
+    """Apply func to every item in a bounded thread pool, keeping input order.
+
+    on_progress(done, total) is called from the calling thread after each item
+    finishes. If any call fails, pending calls are cancelled and the error is
+    re-raised. Each call runs in a copy of the caller's context, so telemetry
+    lands in the caller's trace.
+    """
+    items = list(items)
+    if not items:
+        return []
+    max_workers = max(1, min(max_workers or MAX_CONCURRENT_CALLS, len(items)))
+    results = [None] * len(items)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            executor.submit(contextvars.copy_context().run, func, item): i for i, item in enumerate(items)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if on_progress:
+                on_progress(done, len(items))
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    return results
+
+def analyze_parts(parts, max_workers=None, on_progress=None):
+    """Analyze text parts concurrently; results keep the order of parts."""
+    return run_concurrently(analyze_text_part, parts, max_workers, on_progress)
+
+def _combine_messages(analyses):
+    """Build the prompt that merges partial analyses."""
     combined = "\n\n---\n\n".join(analyses)
     final_prompt = f"""
 Merge the following partial competitive analyses into one complete competitive analysis.
@@ -178,26 +489,553 @@ Rules:
 Partial Analyses:
 {combined}
 """
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You are an expert business consultant who strictly uses only provided data."},
-            {"role": "user", "content": final_prompt}
-        ]
-    )
-    return response.choices[0].message.content.strip()
+    return [
+        {"role": "system", "content": "You are an expert business consultant who strictly uses only provided data."},
+        {"role": "user", "content": final_prompt}
+    ]
 
-def generate_company_summary(analysis_text):
-    """Generate one-paragraph summary."""
+def combine_analyses(analyses):
+    """Combine multiple analyses into one."""
+    return chat_completion(model="gpt-4o-mini", messages=_combine_messages(analyses))
+
+def combine_analyses_stream(analyses):
+    """Combine multiple analyses into one, yielding the text as it is generated."""
+    return stream_chat_completion(model="gpt-4o-mini", messages=_combine_messages(analyses))
+
+def _merge_group(group):
+    """Merge one group of partial analyses; a lone leftover is carried up unchanged."""
+    return group[0] if len(group) == 1 else combine_analyses(group)
+
+def reduce_analyses(analyses, fan_in=None, max_workers=None):
+    """Merge partial analyses level by level until at most fan_in remain.
+
+    Each level merges groups of fan_in analyses in parallel, so prompt size stays
+    bounded and the number of sequential rounds grows logarithmically.
+    """
+    fan_in = max(2, fan_in or COMBINE_FAN_IN)
+    level = list(analyses)
+    while len(level) > fan_in:
+        groups = [level[i:i + fan_in] for i in range(0, len(level), fan_in)]
+        level = run_concurrently(_merge_group, groups, max_workers)
+    return level
+
+def combine_analyses_tree(analyses, fan_in=None, max_workers=None):
+    """Combine any number of analyses with a bounded fan-in tree reduce."""
+    return combine_analyses(reduce_analyses(analyses, fan_in, max_workers))
+
+def _summary_messages(analysis_text):
+    """Build the one-paragraph summary prompt."""
     prompt = f"""
 Summarize the following competitive analysis into one concise paragraph in English.
 
 Text:
 {analysis_text}
 """
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
+    return [{"role": "user", "content": prompt}]
+
+def generate_company_summary(analysis_text):
+    """Generate one-paragraph summary."""
+    return chat_completion(model="gpt-4o-mini", messages=_summary_messages(analysis_text), temperature=0)
+
+def generate_company_summary_stream(analysis_text):
+    """Generate one-paragraph summary, yielding the text as it is generated."""
+    return stream_chat_completion(model="gpt-4o-mini", messages=_summary_messages(analysis_text), temperature=0)
+
+def _compare_messages(name1, analysis1, name2, analysis2):
+    """Build the prompt that compares two companies."""
+    compare_prompt = f"""
+Compare these two companies based only on their analyses:
+
+Company 1 ({name1}):
+{analysis1}
+
+Company 2 ({name2}):
+{analysis2}
+
+Focus on:
+1. Target Market
+2. Strengths
+3. Weaknesses
+4. Main Services or Products
+5. Provide one final summary paragraph comparing both companies.
+"""
+    return [{"role": "user", "content": compare_prompt}]
+
+def compare_companies(name1, analysis1, name2, analysis2):
+    """Compare two companies from their analyses."""
+    return chat_completion(
+        model="gpt-4o-mini", messages=_compare_messages(name1, analysis1, name2, analysis2), temperature=0
+    )
+
+def compare_companies_stream(name1, analysis1, name2, analysis2):
+    """Compare two companies from their analyses, yielding the text as it is generated."""
+    return stream_chat_completion(
+        model="gpt-4o-mini", messages=_compare_messages(name1, analysis1, name2, analysis2), temperature=0
+    )
+
+# Word budget per section in the compact summaries the comparison matrix is built from
+SECTION_SUMMARY_WORDS = int(os.getenv("SECTION_SUMMARY_WORDS", "60"))
+
+def _json_reply(messages):
+    """Run a JSON-mode completion and return the decoded object."""
+    answer = chat_completion(
+        model="gpt-4o-mini", messages=messages, temperature=0, response_format={"type": "json_object"}
     )
-    return response.choices[0].message.content.strip()
+    try:
+        result = json.loads(answer)
+    except ValueError:
+        result = None
+    if not isinstance(result, dict):
+        raise ValueError("The model did not return a JSON object")
+    return result
+
+def summarize_sections(analysis):
+    """Condense an analysis into {section_key: summary} of at most SECTION_SUMMARY_WORDS words each."""
+    keys = ", ".join(f'"{key}" ({heading})' for key, heading in ANALYSIS_SECTIONS)
+    prompt = f"""
+Condense each section of the following competitive analysis into at most {SECTION_SUMMARY_WORDS} words.
+Keep concrete facts (products, markets, numbers) and drop everything else.
+
+Return a JSON object with these string keys: {keys}.
+If a section has no information, write: "Not specified".
+
+Analysis:
+{analysis}
+"""
+    result = _json_reply([{"role": "user", "content": prompt}])
+    return {key: str(result.get(key) or "Not specified").strip() for key, _ in ANALYSIS_SECTIONS}
+
+def compare_section_pair(name1, sections1, name2, sections2):
+    """Compare two companies section by section from their compact summaries.
+
+    Returns {section_key: {"leader": 1, 2 or 0 for even, "note": one sentence}}.
+    """
+    def describe(sections):
+        return "\n".join(f"- {heading}: {sections.get(key, 'Not specified')}" for key, heading in ANALYSIS_SECTIONS)
+
+    keys = ", ".join(f'"{key}"' for key, _ in ANALYSIS_SECTIONS)
+    prompt = f"""
+Compare two companies section by section, based only on these summaries.
+
+Company 1 ({name1}):
+{describe(sections1)}
+
+Company 2 ({name2}):
+{describe(sections2)}
+
+Return a JSON object with the keys {keys}. Each value is an object with
+"leader" (1 or 2 for the company in the stronger position, 0 if even or unclear)
+and "note" (one sentence explaining the difference).
+"""
+    result = _json_reply([{"role": "user", "content": prompt}])
+    comparison = {}
+    for key, _ in ANALYSIS_SECTIONS:
+        entry = result.get(key) if isinstance(result.get(key), dict) else {}
+        leader = str(entry.get("leader", 0)).strip()
+        comparison[key] = {
+            "leader": int(leader) if leader in ("1", "2") else 0,
+            "note": str(entry.get("note") or "Not specified").strip(),
+        }
+    return comparison
+
+def _collect_stream(stream, stage, on_delta):
+    """Join a streamed completion, passing each piece to on_delta(stage, piece)."""
+    pieces = []
+    for piece in stream:
+        pieces.append(piece)
+        on_delta(stage, piece)
+    return "".join(pieces).strip()
+
+def content_hash(text):
+    """Hash source text, ignoring whitespace differences, to recognise the same input."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+def find_near_duplicate(text, company=None, min_similarity=None, simhash=None):
+    """Return the most similar stored article at least min_similarity alike, or None.
+
+    The result is {"source_hash", "company", "url", "chunk_hashes", "similarity",
+    "created_at"}, where chunk_hashes are the chunks of the stored article.
+    With company, only that company's articles are considered.
+    """
+    min_similarity = NEAR_DUPLICATE_SIMILARITY if min_similarity is None else min_similarity
+    simhash = fingerprint.simhash(text) if simhash is None else simhash
+    if simhash is None or not min_similarity:
+        return None
+    best = None
+    for row in storage.find_fingerprint_candidates(fingerprint.band_keys(simhash)):
+        if company and row["company"].lower() != company.lower():
+            continue
+        score = fingerprint.similarity(simhash, fingerprint.from_signed(row["simhash"]))
+        if score >= min_similarity and (best is None or score > best["similarity"]):
+            best = dict(row, similarity=score)
+            del best["simhash"]
+    return best
+
+def run_analysis_pipeline(text_or_url, company_name=None, on_progress=None, on_delta=None, reuse_max_age=None,
+                          incremental=False, save=False):
+    """Run the full analysis for one article or text without any UI.
+
+    Stages: fetch → identify → chunk → map → reduce → summary. Text that fits in
+    one part skips map, reduce and summary for a single "analyze" call.
+    on_progress(stage, done, total) is called as stages start and as chunks
+    finish. If on_delta(stage, text) is given, the final merge and the summary
+    are streamed through it.
+    With reuse_max_age, a stored analysis of the same company and source text
+    that is at most that many seconds old is returned instead of recomputing.
+    With reuse_max_age the text is also checked, before any LLM call, against
+    the fingerprints of earlier articles; for a near-duplicate a fresh stored
+    analysis is reused and reported in duplicate_of if it was computed from the
+    matching article or, with incremental, has it merged in. Chunk analyses are
+    stored per company, so chunks seen before are not mapped again. With
+    incremental, only the chunks not yet part of the company's stored analysis
+    are merged into it instead of replacing it. With save, the analysis is
+    stored together with the list of chunks it covers, in one transaction;
+    merges into the same company are serialized.
+    Returns a dict with company, analysis, summary, parts, new_parts,
+    source_hash, reused, duplicate_of, per-stage timings in seconds and the
+    run's telemetry summary.
+    """
+    with telemetry.trace("analysis") as run:
+        result = _analysis_pipeline(
+            text_or_url, company_name, on_progress, on_delta, reuse_max_age, incremental, save
+        )
+        run.attrs["company"] = result["company"]
+    result["timings"] = dict(run.stages)
+    result["telemetry"] = run.summary()
+    return result
+
+def _company_lock(company):
+    """Lock serializing merges into one company's analysis within this process."""
+    with _company_locks_lock:
+        return _company_locks.setdefault(company.lower(), threading.Lock())
+
+def _analysis_pipeline(text_or_url, company_name, on_progress, on_delta, reuse_max_age, incremental, save):
+    def report(stage, done=0, total=1):
+        if on_progress:
+            on_progress(stage, done, total)
+
+    def timed(stage, func, *args, **kwargs):
+        report(stage)
+        with telemetry.span(stage):
+            return func(*args, **kwargs)
+
+    def finish(analysis, summary, parts=0, new_parts=0, reused=False, duplicate_of=None):
+        if not reused and simhash is not None:
+            storage.save_fingerprint(
+                source_hash, company_name, fingerprint.to_signed(simhash), fingerprint.band_keys(simhash), url,
+                unique_parts
+            )
+        return {
+            "company": company_name,
+            "analysis": analysis,
+            "summary": summary,
+            "parts": parts,
+            "new_parts": new_parts,
+            "source_hash": source_hash,
+            "reused": reused,
+            "duplicate_of": duplicate_of,
+        }
+
+    text = text_or_url
+    url = None
+    if text_or_url.startswith("http"):
+        url = text_or_url
+        text = timed("fetch", _fetch_article_text, text_or_url)
+    if not text.strip():
+        raise ValueError("Could not retrieve text for the company. Please provide a longer article or a valid URL.")
+    source_hash = content_hash(text)
+
+    # Syndicated copies of an article already analyzed are answered from storage
+    with telemetry.span("dedupe"):
+        simhash = fingerprint.simhash(text) if NEAR_DUPLICATE_SIMILARITY else None
+        duplicate = find_near_duplicate(text, company_name, simhash=simhash) if reuse_max_age else None
+        stored = storage.get_analysis(duplicate["company"]) if duplicate else None
+        # Like any reuse, the stored analysis must be fresh
+        if stored and time.time() - stored["updated_at"] > reuse_max_age:
+            stored = None
+        # It must also still cover the matching article: computed from it, or, when merging
+        # is wanted, with every one of its chunks merged in
+        if stored and stored["source_hash"] != duplicate["source_hash"]:
+            chunk_hashes = duplicate["chunk_hashes"]
+            if not (incremental and chunk_hashes
+                    and storage.merged_chunk_hashes(duplicate["company"], chunk_hashes) == set(chunk_hashes)):
+                stored = None
+    if stored:
+        company_name = duplicate["company"]
+        del duplicate["chunk_hashes"]
+        return finish(stored["analysis"], stored["summary"], reused=True, duplicate_of=duplicate)
+
+    if not company_name:
+        company_name = timed("identify", extract_company_name, text)
+    if reuse_max_age:
+        stored = storage.find_analysis(company_name, source_hash, reuse_max_age)
+        if stored:
+            return finish(stored["analysis"], stored["summary"], reused=True)
+
+    parts = timed("chunk", split_text, text)
+    part_hashes = [content_hash(part) for part in parts]
+    # Distinct chunks of this input, in order
+    unique_parts = {}
+    for part_hash, part in zip(part_hashes, parts):
+        unique_parts.setdefault(part_hash, part)
+    # Chunk analyses stored by earlier runs are not mapped again
+    known = storage.get_chunk_analyses(company_name, part_hashes)
+
+    def build(existing, merged):
+        """Analyze the chunks not in merged and fold them into existing (or each other).
+
+        Returns (analysis, summary, number of chunks folded in).
+        """
+        new_hashes = [part_hash for part_hash in unique_parts if part_hash not in merged]
+        to_map = {part_hash: unique_parts[part_hash] for part_hash in new_hashes if part_hash not in known}
+
+        if not existing and FUSED_ANALYSIS and len(parts) == 1 and to_map:
+            fused = timed("analyze", analyze_short_text, parts[0])
+            if fused:
+                analysis, summary = fused
+                known[part_hashes[0]] = analysis
+                storage.save_chunk_analyses(company_name, {part_hashes[0]: analysis})
+                if on_delta:
+                    on_delta("analysis", analysis)
+                    on_delta("summary", summary)
+                return analysis, summary, 1
+
+        if to_map:
+            mapped = timed(
+                "map", analyze_parts, list(to_map.values()),
+                on_progress=lambda done, total: report("map", done, total)
+            )
+            new_analyses = dict(zip(to_map, mapped))
+            # Kept for retries; they only count as merged once an analysis containing them is saved
+            storage.save_chunk_analyses(company_name, new_analyses)
+            known.update(new_analyses)
+        # Fold only the new material into the stored analysis
+        analyses = ([existing["analysis"]] if existing else []) + [known[part_hash] for part_hash in new_hashes]
+
+        if len(analyses) == 1:
+            analysis = analyses[0]
+            if on_delta:
+                on_delta("analysis", analysis)
+        elif on_delta:
+            analysis = timed("reduce", lambda: _collect_stream(
+                combine_analyses_stream(reduce_analyses(analyses)), "analysis", on_delta
+            ))
+        else:
+            analysis = timed("reduce", combine_analyses_tree, analyses)
+        if on_delta:
+            summary = timed("summary", lambda: _collect_stream(
+                generate_company_summary_stream(analysis), "summary", on_delta
+            ))
+        else:
+            summary = timed("summary", generate_company_summary, analysis)
+        return analysis, summary, len(new_hashes)
+
+    if not (incremental or save):
+        analysis, summary, new_count = build(None, set())
+        return finish(analysis, summary, len(parts), new_count)
+
+    # Merges into one company's analysis run one at a time in this process; the
+    # save also checks that no other process wrote the analysis in between
+    with _company_lock(company_name):
+        for _ in range(MERGE_ATTEMPTS):
+            existing = storage.get_analysis(company_name) if incremental else None
+            merged = storage.merged_chunk_hashes(company_name, unique_parts) if existing else set()
+            if existing and len(merged) == len(unique_parts):
+                # Everything in this input is already part of the stored analysis
+                return finish(existing["analysis"], existing["summary"], len(parts), reused=True)
+            analysis, summary, new_count = build(existing, merged)
+            if not save or storage.save_analysis(
+                    company_name, analysis, summary, source_hash, chunk_hashes=unique_parts,
+                    replace_chunks=not existing,
+                    expected_updated_at=(existing["updated_at"] if existing else 0) if incremental else None):
+                return finish(analysis, summary, len(parts), new_count)
+    raise RuntimeError(f"The analysis of {company_name} kept changing while new material was merged into it")
+
+def run_compare_pipeline(input1, name1, input2, name2, on_progress=None, on_delta=None,
+                         reuse_max_age=ANALYSIS_REUSE_MAX_AGE, save=False):
+    """Analyze two companies concurrently and compare them.
+
+    Fresh stored analyses of the same company and source are reused, and each
+    article is merged into its company's stored analysis (saved if save). If
+    on_delta(stage, text) is given, the comparison is streamed through it.
+    Returns {"comparison", "analyses", "telemetry"} where analyses holds both
+    pipeline results and telemetry covers the whole run.
+    """
+    def run_one(args):
+        text_or_url, name = args
+        return run_analysis_pipeline(
+            text_or_url, name, on_progress=on_progress, reuse_max_age=reuse_max_age, incremental=True, save=save
+        )
+
+    with telemetry.trace("compare", companies=[name1, name2]) as run:
+        result1, result2 = run_concurrently(run_one, [(input1, name1), (input2, name2)], max_workers=2)
+
+        if on_progress:
+            on_progress("compare", 0, 1)
+        analysis1, analysis2 = result1["analysis"], result2["analysis"]
+        with telemetry.span("compare"):
+            if on_delta:
+                comparison = _collect_stream(
+                    compare_companies_stream(name1, analysis1, name2, analysis2), "comparison", on_delta
+                )
+            else:
+                comparison = compare_companies(name1, analysis1, name2, analysis2)
+    summary = run.summary()
+    for result in (result1, result2):
+        for stage, seconds in result["timings"].items():
+            summary["stages"][f"{result['company']}: {stage}"] = seconds
+    return {"comparison": comparison, "analyses": [result1, result2], "telemetry": summary}
+
+def _stored_analysis_result(name):
+    """A pipeline-shaped result for a company analyzed earlier."""
+    stored = storage.get_analysis(name)
+    if not stored:
+        raise ValueError(f"No saved analysis found for {name}. Please provide an article or URL.")
+    return {
+        "company": name,
+        "analysis": stored["analysis"],
+        "summary": stored["summary"],
+        "parts": 0,
+        "new_parts": 0,
+        "source_hash": stored["source_hash"],
+        "reused": True,
+        "duplicate_of": None,
+        "timings": {},
+    }
+
+def run_matrix_pipeline(inputs, on_progress=None, reuse_max_age=ANALYSIS_REUSE_MAX_AGE, max_workers=None, save=False):
+    """Compare any number of companies section by section.
+
+    inputs is a list of (text_or_url, name) pairs; with no text the saved
+    analysis of name is used. Each company is analyzed once, concurrently, with
+    new articles merged into its stored analysis (saved if save); inputs naming
+    the same company are analyzed together as one text. Each analysis is then
+    condensed into short per-section summaries. Every pair is then
+    compared from those summaries, so prompts stay small however many companies
+    there are. Section summaries and pair comparisons are stored keyed by the
+    analyses they came from, so adding a company only runs the new pairs.
+    Returns {"companies", "matrix", "analyses", "pairs", "pairs_computed",
+    "telemetry"}; matrix[section_key][row][column] is {"leader", "note"} with
+    leader the name of the stronger company or None.
+    """
+    def report(stage, done=0, total=1):
+        if on_progress:
+            on_progress(stage, done, total)
+
+    def run_group(group):
+        """Analyze every input about one company in a single run."""
+        name = group[0][1]
+        sources = [text_or_url for text_or_url, _ in group if (text_or_url or "").strip()]
+        if not sources:
+            return _stored_analysis_result(name)
+        source = sources[0]
+        if len(sources) > 1:
+            with telemetry.span("fetch"):
+                source = "\n\n".join(
+                    _fetch_article_text(text_or_url) if text_or_url.startswith("http") else text_or_url
+                    for text_or_url in sources
+                )
+        return run_analysis_pipeline(
+            source, name or None, on_progress=on_progress, reuse_max_age=reuse_max_age, incremental=True, save=save
+        )
+
+    def sections_for(result):
+        analysis_hash = content_hash(result["analysis"])
+        sections = storage.get_section_summaries(analysis_hash)
+        if sections is None:
+            sections = summarize_sections(result["analysis"])
+            storage.save_section_summaries(analysis_hash, result["company"], sections)
+        return analysis_hash, sections
+
+    def compare_pair(pair):
+        (name1, hash1, sections1), (name2, hash2, sections2) = pair
+        stored = storage.get_pair_comparison(name1, hash1, name2, hash2)
+        if stored is not None:
+            return stored, False
+        comparison = compare_section_pair(name1, sections1, name2, sections2)
+        storage.save_pair_comparison(name1, hash1, name2, hash2, comparison)
+        return comparison, True
+
+    with telemetry.trace("matrix", companies=[name for _, name in inputs]) as run:
+        # Inputs naming the same company are grouped up front, so it is analyzed once with all its material
+        groups = {}
+        for index, (text_or_url, name) in enumerate(inputs):
+            groups.setdefault(name.strip().lower() if (name or "").strip() else index, []).append((text_or_url, name))
+        results = run_concurrently(run_group, list(groups.values()), max_workers)
+        # Unnamed inputs can still turn out to be the same company; it is compared once
+        by_company = {}
+        for result in results:
+            by_company.setdefault(result["company"].lower(), []).append(result)
+        analyses = []
+        for same in by_company.values():
+            result = max(same, key=lambda r: r["new_parts"])
+            if len(same) > 1 and save:
+                # Each run merged its article into the stored analysis; now that all have finished it has them all
+                stored = storage.get_analysis(result["company"])
+                result = dict(result, analysis=stored["analysis"], summary=stored["summary"],
+                              source_hash=stored["source_hash"])
+            analyses.append(result)
+        if len(analyses) < 2:
+            raise ValueError("The comparison matrix needs at least two different companies.")
+
+        report("sections", 0, len(analyses))
+        with telemetry.span("sections"):
+            summaries = run_concurrently(
+                sections_for, analyses, max_workers, on_progress=lambda done, total: report("sections", done, total)
+            )
+
+        # Pairs are ordered by name so a stored comparison is found whichever way round it was asked
+        entries = sorted(
+            ((result["company"], analysis_hash, sections) for result, (analysis_hash, sections) in zip(analyses, summaries)),
+            key=lambda entry: entry[0].lower()
+        )
+        pairs = [(entries[i], entries[j]) for i in range(len(entries)) for j in range(i + 1, len(entries))]
+        report("matrix", 0, len(pairs))
+        with telemetry.span("matrix"):
+            compared = run_concurrently(
+                compare_pair, pairs, max_workers, on_progress=lambda done, total: report("matrix", done, total)
+            )
+
+    companies = [result["company"] for result in analyses]
+    matrix = {key: {row: {} for row in companies} for key, _ in ANALYSIS_SECTIONS}
+    pair_results = []
+    for ((name1, _, _), (name2, _, _)), (comparison, _) in zip(pairs, compared):
+        pair_results.append({"companies": [name1, name2], "sections": comparison})
+        for key, cell in comparison.items():
+            leader = {1: name1, 2: name2}.get(cell["leader"])
+            matrix[key][name1][name2] = matrix[key][name2][name1] = {"leader": leader, "note": cell["note"]}
+    summary = run.summary()
+    for result in analyses:
+        for stage, seconds in result["timings"].items():
+            summary["stages"][f"{result['company']}: {stage}"] = seconds
+    return {
+        "companies": companies,
+        "matrix": matrix,
+        "analyses": analyses,
+        "pairs": pair_results,
+        "pairs_computed": sum(computed for _, computed in compared),
+        "telemetry": summary,
+    }
+
+def matrix_cell(cell, row):
+    """Short label for one matrix cell, from the point of view of the row company."""
+    if cell is None:
+        return "—"
+    if cell["leader"] is None:
+        return "= even"
+    return "▲ ahead" if cell["leader"] == row else "▼ behind"
+
+def format_matrix(result):
+    """Render a comparison matrix as Markdown: one table per section plus the pair notes."""
+    companies = result["companies"]
+    lines = [f"Comparison of {', '.join(companies)}"]
+    for key, heading in ANALYSIS_SECTIONS:
+        lines += ["", f"### {heading}", "", "| | " + " | ".join(companies) + " |",
+                  "|---" * (len(companies) + 1) + "|"]
+        for row in companies:
+            cells = [matrix_cell(result["matrix"][key][row].get(column), row) for column in companies]
+            lines.append(f"| **{row}** | " + " | ".join(cells) + " |")
+        lines.append("")
+        for pair in result["pairs"]:
+            lines.append(f"- {pair['companies'][0]} vs {pair['companies'][1]}: {pair['sections'][key]['note']}")
+    return "\n".join(lines)
@@ -0,0 +1,185 @@
+"""Article download and text extraction.
+
+download() fetches a page with connect/read timeouts, an overall deadline,
+a maximum size and a content-type check. extract() runs the configured
+extractor backends in order (trafilatura and lxml first, newspaper as the
+fallback) and returns the first result with enough text. Every backend is
+timed as its own telemetry stage (extract_<name>).
+
+Backends are plain functions (html, url) -> {"title", "text", "site_name"}
+or None; register_extractor adds one.
+"""
+import os
+import time
+
+import telemetry
+
+# --- Fetch limits (override through the environment) ---
+FETCH_CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "5"))
+FETCH_READ_TIMEOUT = float(os.getenv("FETCH_READ_TIMEOUT", "15"))
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "30"))  # seconds for the whole download
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(5 * 1024 * 1024)))
+ALLOWED_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+# Backends tried in order; a result shorter than MIN_TEXT_CHARS falls through to the next
+EXTRACTOR_ORDER = [name.strip() for name in os.getenv("EXTRACTORS", "trafilatura,lxml,newspaper").split(",")]
+MIN_TEXT_CHARS = 200
+
+# Block-level elements whose text the lxml backend keeps
+_TEXT_TAGS = ("p", "h2", "h3", "li", "blockquote")
+
+_extractors = {}
+_unavailable = set()
+
+
+class FetchError(Exception):
+    """The page could not be downloaded or is not an article we can parse."""
+
+
+def download(url, headers=None, allowed_types=ALLOWED_CONTENT_TYPES):
+    """GET url within the fetch limits; returns (response, body_bytes).
+
+    A 304 response is returned with an empty body so callers can revalidate
+    cached copies. Responses whose content type is not in allowed_types are
+    rejected before the body is read.
+    """
+    # requests is slow to import, so it is loaded on first fetch
+    import requests
+
+    response = requests.get(
+        url, headers=headers, stream=True, timeout=(FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT)
+    )
+    with response:
+        if response.status_code == 304:
+            return response, b""
+        response.raise_for_status()
+
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type and content_type not in allowed_types:
+            raise FetchError(f"Unsupported content type {content_type!r}")
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > FETCH_MAX_BYTES:
+            raise FetchError(f"Page is too large ({int(declared)} bytes, limit {FETCH_MAX_BYTES})")
+
+        deadline = time.monotonic() + FETCH_DEADLINE
+        body = bytearray()
+        for block in response.iter_content(chunk_size=65536):
+            body += block
+            if len(body) > FETCH_MAX_BYTES:
+                raise FetchError(f"Page is larger than the {FETCH_MAX_BYTES} byte limit")
+            if time.monotonic() > deadline:
+                raise FetchError(f"Download took longer than {FETCH_DEADLINE:.0f} seconds")
+    return response, bytes(body)
+
+
+def decode_html(body, response=None):
+    """Decode page bytes using the charset from the response headers, defaulting to UTF-8."""
+    content_type = response.headers.get("Content-Type", "") if response is not None else ""
+    encoding = "utf-8"
+    if "charset=" in content_type.lower():
+        encoding = content_type.lower().split("charset=", 1)[1].split(";")[0].strip(" \"'") or "utf-8"
+    try:
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def register_extractor(name, func):
+    """Add or replace a backend; it is used when its name is listed in EXTRACTOR_ORDER."""
+    _extractors[name] = func
+
+
+def extract(body, url, response=None, order=None):
+    """Run the backends in order and return the first good result.
+
+    The result is {"title", "text", "site_name", "extractor"}. Raises FetchError
+    if no backend finds enough text.
+    """
+    html = decode_html(body, response)
+    best = None
+    for name in order or EXTRACTOR_ORDER:
+        func = _extractors.get(name)
+        if func is None or name in _unavailable:
+            continue
+        try:
+            with telemetry.span(f"extract_{name}"):
+                result = func(html, url)
+        except ImportError as e:
+            _unavailable.add(name)
+            print(f"❌ Extractor {name} is not available: {e}")
+            continue
+        except Exception as e:
+            print(f"❌ Extractor {name} failed on {url}: {e}")
+            continue
+        if not result or not result.get("text"):
+            continue
+        result = {
+            "title": (result.get("title") or "").strip(),
+            "text": result["text"].strip(),
+            "site_name": (result.get("site_name") or "").strip(),
+            "extractor": name,
+        }
+        if len(result["text"]) >= MIN_TEXT_CHARS:
+            return result
+        if best is None or len(result["text"]) > len(best["text"]):
+            best = result
+    if best is None:
+        raise FetchError("No article text could be extracted from the page")
+    return best
+
+
+def _extract_trafilatura(html, url):
+    import trafilatura
+
+    document = trafilatura.bare_extraction(html, url=url, include_comments=False, include_tables=False)
+    if document is None:
+        return None
+    if not isinstance(document, dict):
+        # Newer trafilatura versions return a Document object
+        document = {key: getattr(document, key, None) for key in ("title", "text", "sitename")}
+    return {"title": document.get("title"), "text": document.get("text"), "site_name": document.get("sitename")}
+
+
+def _meta_content(tree, *names):
+    for name in names:
+        values = tree.xpath(f'//meta[@property="{name}" or @name="{name}"]/@content')
+        if values and values[0].strip():
+            return values[0].strip()
+    return ""
+
+
+def _extract_lxml(html, url):
+    """Keep the text blocks of the container (article, main or body) with the most paragraph text."""
+    import lxml.html
+
+    tree = lxml.html.fromstring(html)
+    for element in tree.xpath("//script|//style|//noscript|//nav|//header|//footer|//aside|//form"):
+        element.drop_tree()
+    containers = tree.xpath("//article|//main") or tree.xpath("//body") or [tree]
+    best = max(containers, key=lambda node: sum(len(p.text_content()) for p in node.iter("p")))
+    blocks = []
+    for node in best.iter(*_TEXT_TAGS):
+        text = " ".join(node.text_content().split())
+        if text:
+            blocks.append(text)
+    title = _meta_content(tree, "og:title") or " ".join((tree.findtext(".//title") or "").split())
+    return {"title": title, "text": "\n\n".join(blocks), "site_name": _meta_content(tree, "og:site_name")}
+
+
+def _extract_newspaper(html, url):
+    from newspaper import Article
+
+    article = Article(url)
+    article.download(input_html=html)
+    article.parse()
+    og = (article.meta_data or {}).get("og")
+    return {
+        "title": article.title,
+        "text": article.text,
+        "site_name": og.get("site_name") if isinstance(og, dict) else None,
+    }
+
+
+register_extractor("trafilatura", _extract_trafilatura)
+register_extractor("lxml", _extract_lxml)
+register_extractor("newspaper", _extract_newspaper)
@@ -0,0 +1,300 @@
+"""Feedback classification, from single texts up to very large CSV exports.
+
+classify_feedback_csv processes a CSV in chunks and appends each classified
+chunk to an output file on disk, so memory stays flat whatever the file size.
+A checkpoint written after every chunk lets an interrupted run resume.
+
+Usage:
+    python feedback.py feedback.csv -o classified.csv [--chunk-rows 5000]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+from dotenv import load_dotenv
+
+from core import chat_completion, run_concurrently
+import feedback_model
+import storage
+
+CATEGORIES = ["Bug", "Feature Request", "User Interface", "Other"]
+
+# How many feedback items are packed into one classification prompt
+BATCH_SIZE = 40
+# How many times items with a missing or invalid label are asked about again
+MAX_RETRIES = 2
+
+# --- Streaming CSV settings ---
+FEEDBACK_CHUNK_ROWS = int(os.getenv("FEEDBACK_CHUNK_ROWS", "5000"))
+FEEDBACK_WORK_DIR = os.getenv("FEEDBACK_WORK_DIR", "feedback_runs")
+# Labels remembered across chunks so repeated feedback is classified once per run
+KNOWN_LABELS_MAX = 200000
+
+
+def normalize_feedback(text):
+    """Normalize feedback so trivially different copies are classified once."""
+    if not isinstance(text, str):
+        return ""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _label_key(key):
+    """Storage key of a normalized feedback text."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def parse_category(value):
+    """Map a model answer such as '2. feature request' onto a known category, or None."""
+    if not isinstance(value, str):
+        return None
+    cleaned = re.sub(r"^[\s\d.)-]+", "", value).strip().strip(".\"'").casefold()
+    for category in CATEGORIES:
+        if cleaned == category.casefold():
+            return category
+    return None
+
+
+def classify_feedback(feedback_text):
+    """Classify a single piece of feedback."""
+    prompt = f"""
+Classify the following user feedback into one of these categories:
+1. Bug
+2. Feature Request
+3. User Interface
+4. Other
+
+Feedback: {feedback_text}
+
+Reply with only the category name.
+"""
+    answer = chat_completion(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0
+    )
+    return parse_category(answer) or "Other"
+
+
+def _classify_batch(items):
+    """Classify a list of (id, text) pairs in one call; returns {id: category} for valid answers."""
+    payload = json.dumps([{"id": item_id, "feedback": text} for item_id, text in items], ensure_ascii=False)
+    prompt = f"""
+Classify each user feedback item into exactly one of these categories:
+{", ".join(CATEGORIES)}
+
+Return a JSON object of the form {{"results": [{{"id": <id>, "category": "<category>"}}]}}
+with one entry for every input id. Use the category names exactly as written above.
+
+Feedback items:
+{payload}
+"""
+    answer = chat_completion(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0,
+        response_format={"type": "json_object"}
+    )
+    try:
+        results = json.loads(answer).get("results", [])
+    except (ValueError, AttributeError):
+        return {}
+
+    expected = {item_id for item_id, _ in items}
+    labels = {}
+    for result in results if isinstance(results, list) else []:
+        if not isinstance(result, dict):
+            continue
+        item_id = result.get("id")
+        category = parse_category(result.get("category"))
+        if item_id in expected and category:
+            labels[item_id] = category
+    return labels
+
+
+def classify_feedback_batch(texts, batch_size=BATCH_SIZE, max_workers=None, on_progress=None, known=None):
+    """Classify many feedback texts, deduplicating them and packing them into batched prompts.
+
+    Returns one category per input text, in input order. on_progress(done, total)
+    is called with the number of unique texts labelled so far. known maps
+    normalized texts to categories already decided; those texts are not sent
+    again, and new labels are added to it.
+    Texts the LLM labelled in earlier runs reuse that label, and the local
+    model (see feedback_model) labels the texts it is confident about. Only
+    the rest go to the LLM; their labels are stored to train the model.
+    """
+    keys = [normalize_feedback(t) for t in texts]
+    known = {} if known is None else known
+
+    # One representative text per normalized key, addressed by a small integer id
+    unique = {}
+    for key, text in zip(keys, texts):
+        if key and key not in unique and key not in known:
+            unique[key] = (len(unique), text)
+    id_to_key = {item_id: key for key, (item_id, _) in unique.items()}
+
+    labels = {}
+    label_keys = {key: _label_key(key) for key in unique}
+    stored = storage.get_feedback_labels(label_keys.values())
+    for key, (item_id, _) in unique.items():
+        if label_keys[key] in stored:
+            labels[item_id] = stored[label_keys[key]]
+    remaining = [(item_id, text) for item_id, text in unique.values() if item_id not in labels]
+    predicted = feedback_model.predict_confident([text for _, text in remaining])
+    for (item_id, _), category in zip(remaining, predicted):
+        if category:
+            labels[item_id] = category
+    pending = [(item_id, text) for item_id, text in remaining if item_id not in labels]
+    asked = list(pending)
+    total = len(unique)
+    for _ in range(MAX_RETRIES + 1):
+        if not pending:
+            break
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+        def report(done, _batches, labelled=len(labels)):
+            if on_progress:
+                on_progress(min(total, labelled + done * batch_size), total)
+
+        for result in run_concurrently(_classify_batch, batches, max_workers, report):
+            labels.update(result)
+        # Only items the model skipped or labelled with an unknown category are asked again
+        pending = [(item_id, text) for item_id, text in pending if item_id not in labels]
+
+    # Whatever still has no valid label falls back to the single-item prompt
+    if pending:
+        for item_id, category in zip(
+            [item_id for item_id, _ in pending],
+            run_concurrently(classify_feedback, [text for _, text in pending], max_workers)
+        ):
+            labels[item_id] = category
+    if on_progress:
+        on_progress(total, total)
+
+    if asked:
+        storage.save_feedback_labels(
+            {label_keys[id_to_key[item_id]]: (text, labels[item_id]) for item_id, text in asked}
+        )
+        feedback_model.maybe_retrain()
+
+    by_key = {id_to_key[item_id]: category for item_id, category in labels.items()}
+    if len(known) < KNOWN_LABELS_MAX:
+        known.update(by_key)
+    return [by_key.get(key) or known.get(key, "Other") for key in keys]
+
+
+# --- Streaming CSV classification ---
+def stage_upload(fileobj, work_dir=None):
+    """Copy an uploaded file into its own run directory and return that directory.
+
+    The directory is named after the content hash, so uploading the same file
+    again finds the earlier run and its checkpoint.
+    """
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(1024 * 1024), b""):
+        digest.update(block)
+    run_dir = os.path.join(work_dir or FEEDBACK_WORK_DIR, digest.hexdigest()[:16])
+    input_path = os.path.join(run_dir, "input.csv")
+    if not os.path.exists(input_path):
+        os.makedirs(run_dir, exist_ok=True)
+        fileobj.seek(0)
+        with open(input_path + ".tmp", "wb") as f:
+            shutil.copyfileobj(fileobj, f, 1024 * 1024)
+        os.replace(input_path + ".tmp", input_path)
+    return run_dir
+
+
+def read_checkpoint(output_path):
+    """Return the checkpoint of a CSV run, or None if it has not written a chunk yet."""
+    try:
+        with open(output_path + ".checkpoint", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(output_path, checkpoint):
+    path = output_path + ".checkpoint"
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+def classify_feedback_csv(input_path, output_path, chunk_rows=None, max_workers=None, on_progress=None):
+    """Classify the 'feedback' column of a CSV chunk by chunk, appending to output_path.
+
+    Each finished chunk is flushed to disk before the checkpoint is updated, so
+    a rerun with the same paths truncates any half-written chunk and continues
+    with the next one. on_progress(rows_done, bytes_read, total_bytes) is called
+    after every chunk. Returns the final checkpoint: {"rows", "chunks",
+    "chunk_rows", "output_bytes", "complete"}.
+    """
+    import pandas as pd
+
+    checkpoint = read_checkpoint(output_path)
+    if checkpoint is None or not os.path.exists(output_path):
+        checkpoint = {"rows": 0, "chunks": 0, "chunk_rows": chunk_rows or FEEDBACK_CHUNK_ROWS,
+                      "output_bytes": 0, "complete": False}
+    if checkpoint["complete"]:
+        return checkpoint
+
+    total_bytes = os.path.getsize(input_path)
+    known = {}
+    with open(input_path, "rb") as source, open(output_path, "ab") as out:
+        # Drop whatever the interrupted run wrote after its last checkpoint
+        out.truncate(checkpoint["output_bytes"])
+        out.seek(checkpoint["output_bytes"])
+        # Chunk boundaries must match the earlier run, so its chunk size is kept
+        reader = pd.read_csv(source, chunksize=checkpoint["chunk_rows"])
+        for index, chunk in enumerate(reader):
+            if index == 0 and "feedback" not in chunk.columns:
+                raise ValueError("The CSV must contain a 'feedback' column.")
+            if index < checkpoint["chunks"]:
+                continue
+            chunk["category"] = classify_feedback_batch(
+                chunk["feedback"].tolist(), max_workers=max_workers, known=known
+            )
+            chunk.to_csv(out, header=checkpoint["rows"] == 0, index=False, encoding="utf-8")
+            out.flush()
+            os.fsync(out.fileno())
+            checkpoint.update(rows=checkpoint["rows"] + len(chunk), chunks=index + 1, output_bytes=out.tell())
+            _write_checkpoint(output_path, checkpoint)
+            if on_progress:
+                on_progress(checkpoint["rows"], source.tell(), total_bytes)
+    checkpoint["complete"] = True
+    _write_checkpoint(output_path, checkpoint)
+    if on_progress:
+        on_progress(checkpoint["rows"], total_bytes, total_bytes)
+    return checkpoint
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a feedback CSV in resumable chunks.")
+    parser.add_argument("input", help="CSV file with a 'feedback' column")
+    parser.add_argument("-o", "--output", required=True, help="classified CSV; rerun with the same path to resume")
+    parser.add_argument("--chunk-rows", type=int, default=FEEDBACK_CHUNK_ROWS, help="rows classified per chunk")
+    parser.add_argument("-w", "--workers", type=int, help="concurrent classification calls")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    checkpoint = read_checkpoint(args.output)
+    if checkpoint and not checkpoint["complete"]:
+        print(f"▶ Resuming after {checkpoint['rows']} row(s)")
+
+    def report(rows, done_bytes, total_bytes):
+        print(f"✅ {rows} row(s) classified ({done_bytes / max(total_bytes, 1):.0%} of the input)")
+
+    try:
+        classify_feedback_csv(args.input, args.output, args.chunk_rows, args.workers, report)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+"""Local feedback classifier: hashed TF-IDF features and a softmax model in NumPy.
+
+The model is trained on feedback the LLM has already labelled (the
+feedback_labels table in the history database) and saved to
+FEEDBACK_MODEL_FILE. classify_feedback_batch asks it first and only sends
+rows below FEEDBACK_MODEL_THRESHOLD confidence to the LLM. Their labels are
+stored in turn and feed the next retraining, which runs in the background job
+pool so classification never waits for it.
+
+A fixed share of the labels (chosen by hash, so it never changes between
+retrains) is held out of training. The saved report shows how often the model
+agrees with the LLM on it, overall and on the rows it is confident about.
+
+Usage:
+    python feedback_model.py    # retrain now and print the holdout report
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+
+import jobs
+import storage
+
+# --- Model settings (override through the environment) ---
+FEEDBACK_MODEL_FILE = os.getenv("FEEDBACK_MODEL_FILE", "feedback_model.npz")
+FEEDBACK_MODEL_ENABLED = os.getenv("FEEDBACK_MODEL_ENABLED", "1") != "0"
+# Rows the model is less sure about than this go to the LLM
+FEEDBACK_MODEL_THRESHOLD = float(os.getenv("FEEDBACK_MODEL_THRESHOLD", "0.8"))
+# A model that agrees with the LLM on fewer held-out rows than this is not used
+FEEDBACK_MODEL_MIN_AGREEMENT = float(os.getenv("FEEDBACK_MODEL_MIN_AGREEMENT", "0.85"))
+MIN_TRAINING_LABELS = int(os.getenv("FEEDBACK_MIN_TRAINING_LABELS", "200"))
+RETRAIN_EVERY = int(os.getenv("FEEDBACK_RETRAIN_EVERY", "1000"))  # new labels before the model is retrained
+MAX_TRAINING_LABELS = 50000  # newest labels used for training
+HOLDOUT_PERCENT = 20
+
+# --- Training settings ---
+HASH_FEATURES = 2 ** 18
+MAX_EPOCHS = 300
+TOLERANCE = 1e-4  # relative loss improvement below which training stops
+POWER_ITERATIONS = 20
+L2_PENALTY = 1e-6
+
+_WORD_RE = re.compile(r"\w+")
+
+_lock = threading.Lock()
+_model = None
+_model_mtime = None
+_stats = {"local": 0, "fallback": 0}
+_retraining = False
+
+
+def _tokens(text):
+    """Words and word pairs of a text."""
+    words = _WORD_RE.findall(text.casefold())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _hashed_counts(texts):
+    """Token counts per text as flat (row_ids, columns, counts) arrays.
+
+    Tokens are hashed with CRC32, which unlike hash() is stable across processes.
+    """
+    import numpy as np
+
+    rows, columns, counts = [], [], []
+    for row, text in enumerate(texts):
+        hashed = Counter(zlib.crc32(token.encode("utf-8")) % HASH_FEATURES for token in _tokens(text or ""))
+        rows.extend([row] * len(hashed))
+        columns.extend(hashed)
+        counts.extend(hashed.values())
+    return np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64), np.array(counts, dtype=np.float32)
+
+
+def _features(texts, idf):
+    """Sparse TF-IDF rows (log-scaled counts, L2-normalized) as (row_ids, columns, values)."""
+    import numpy as np
+
+    rows, columns, counts = _hashed_counts(texts)
+    values = np.log1p(counts) * idf[columns]
+    norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(texts)))
+    values = values / np.where(norms > 0, norms, 1.0)[rows]
+    return rows, columns, values.astype(np.float32)
+
+
+def _probabilities(features, weights, bias, n_rows):
+    """Softmax class probabilities for sparse feature rows."""
+    import numpy as np
+
+    rows, columns, values = features
+    contributions = values[:, None] * weights[columns]
+    scores = np.stack(
+        [np.bincount(rows, weights=contributions[:, k], minlength=n_rows) for k in range(weights.shape[1])], axis=1
+    ) + bias
+    scores -= scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class FeedbackModel:
+    """A trained classifier: category names, IDF weights, class weights and the holdout report."""
+
+    def __init__(self, classes, idf, weights, bias, report):
+        self.classes = list(classes)
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+        self.report = report
+
+    def predict(self, texts):
+        """Return (categories, confidences) for a list of texts."""
+        probabilities = _probabilities(_features(texts, self.idf), self.weights, self.bias, len(texts))
+        best = probabilities.argmax(axis=1)
+        return [self.classes[i] for i in best], probabilities.max(axis=1)
+
+    def save(self, path):
+        """Write the model atomically, so other processes never load a partial file."""
+        import numpy as np
+
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(
+                f, classes=np.array(self.classes), idf=self.idf, weights=self.weights, bias=self.bias,
+                report=np.array(json.dumps(self.report))
+            )
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+
+        with np.load(path) as data:
+            return cls(
+                [str(name) for name in data["classes"]], data["idf"], data["weights"], data["bias"],
+                json.loads(str(data["report"]))
+            )
+
+
+def _step_size(rows, columns, values, n_rows, n_features):
+    """A gradient step that cannot overshoot: 1 / the curvature bound of the mean softmax loss.
+
+    The curvature is at most half the largest eigenvalue of X'X / n (with a
+    constant bias column), which a few rounds of power iteration estimate.
+    """
+    import numpy as np
+
+    vector = np.ones(n_features + 1) / np.sqrt(n_features + 1)
+    eigenvalue = 1.0
+    for _ in range(POWER_ITERATIONS):
+        projected = np.bincount(rows, weights=values * vector[columns], minlength=n_rows) + vector[-1]
+        product = np.append(np.bincount(columns, weights=values * projected[rows], minlength=n_features),
+                            projected.sum()) / n_rows
+        eigenvalue = np.linalg.norm(product)
+        vector = product / eigenvalue
+    # Power iteration approaches the eigenvalue from below, so leave some margin
+    return 1 / (0.5 * eigenvalue * 1.1)
+
+
+def fit(texts, labels):
+    """Train a model on texts and their categories.
+
+    Uses accelerated full-batch gradient descent with a step derived from the
+    data, restarting the momentum whenever the loss goes up, and stops once
+    the loss no longer improves by TOLERANCE.
+    """
+    import numpy as np
+
+    classes = sorted(set(labels))
+    n_rows = len(texts)
+    _, columns, _ = _hashed_counts(texts)
+    document_frequency = np.bincount(columns, minlength=HASH_FEATURES)
+    idf = (np.log((1 + n_rows) / (1 + document_frequency)) + 1).astype(np.float32)
+    features = _features(texts, idf)
+
+    targets = np.zeros((n_rows, len(classes)))
+    targets[np.arange(n_rows), [classes.index(label) for label in labels]] = 1
+    # Train only the hashed features that occur, then place them in the full weight matrix
+    used, compact = np.unique(features[1], return_inverse=True)
+    rows, values = features[0], features[2].astype(np.float64)
+    compact_features = (rows, compact, values)
+    step = _step_size(rows, compact, values, n_rows, len(used))
+
+    weights = np.zeros((len(used), len(classes)))
+    bias = np.log(targets.mean(axis=0) + 1e-9)
+    # Nesterov look-ahead point and momentum
+    ahead_weights, ahead_bias, momentum = weights.copy(), bias.copy(), 1.0
+    previous_loss = np.inf
+    for _ in range(MAX_EPOCHS):
+        probabilities = _probabilities(compact_features, ahead_weights, ahead_bias, n_rows)
+        loss = -np.mean(np.log(probabilities[targets == 1] + 1e-12))
+        if loss > previous_loss:
+            # Overshot: drop the momentum and continue from the last plain step
+            ahead_weights, ahead_bias, momentum = weights.copy(), bias.copy(), 1.0
+            probabilities = _probabilities(compact_features, ahead_weights, ahead_bias, n_rows)
+            loss = -np.mean(np.log(probabilities[targets == 1] + 1e-12))
+        if previous_loss - loss < TOLERANCE * max(loss, 1e-12):
+            break
+        previous_loss = loss
+
+        error = (probabilities - targets) / n_rows
+        gradient = np.stack(
+            [np.bincount(compact, weights=values * error[rows, k], minlength=len(used)) for k in range(len(classes))],
+            axis=1
+        ) + L2_PENALTY * ahead_weights
+        next_weights = ahead_weights - step * gradient
+        next_bias = ahead_bias - step * error.sum(axis=0)
+        next_momentum = (1 + (1 + 4 * momentum ** 2) ** 0.5) / 2
+        blend = (momentum - 1) / next_momentum
+        ahead_weights = next_weights + blend * (next_weights - weights)
+        ahead_bias = next_bias + blend * (next_bias - bias)
+        weights, bias, momentum = next_weights, next_bias, next_momentum
+
+    full_weights = np.zeros((HASH_FEATURES, len(classes)), dtype=np.float32)
+    full_weights[used] = weights
+    return FeedbackModel(classes, idf, full_weights, bias, {})
+
+
+def _in_holdout(text_key):
+    return zlib.crc32(text_key.encode("utf-8")) % 100 < HOLDOUT_PERCENT
+
+
+def evaluate(model, texts, labels, threshold=None):
+    """Agreement of the model with the given labels, overall and above the confidence threshold."""
+    threshold = FEEDBACK_MODEL_THRESHOLD if threshold is None else threshold
+    if not texts:
+        return {"holdout": 0, "agreement": None, "confident_share": None, "confident_agreement": None}
+    predicted, confidences = model.predict(texts)
+    agree = [p == label for p, label in zip(predicted, labels)]
+    confident = [a for a, confidence in zip(agree, confidences) if confidence >= threshold]
+    return {
+        "holdout": len(texts),
+        "agreement": sum(agree) / len(agree),
+        "confident_share": len(confident) / len(agree),
+        "confident_agreement": sum(confident) / len(confident) if confident else None,
+    }
+
+
+def train(path=None):
+    """Retrain on the stored LLM labels, save the model and return its report.
+
+    Returns None if there are fewer than MIN_TRAINING_LABELS labels.
+    """
+    global _model, _model_mtime
+    started = time.perf_counter()
+    labelled = storage.load_feedback_labels(MAX_TRAINING_LABELS)
+    training = [(text, category) for key, text, category in labelled if not _in_holdout(key)]
+    holdout = [(text, category) for key, text, category in labelled if _in_holdout(key)]
+    if len(labelled) < MIN_TRAINING_LABELS or len({category for _, category in training}) < 2:
+        return None
+
+    model = fit([text for text, _ in training], [category for _, category in training])
+    model.report = {
+        "labels": len(labelled),
+        "trained_on": len(training),
+        "threshold": FEEDBACK_MODEL_THRESHOLD,
+        **evaluate(model, [text for text, _ in holdout], [category for _, category in holdout]),
+        "seconds": time.perf_counter() - started,
+        "trained_at": time.time(),
+    }
+    path = path or FEEDBACK_MODEL_FILE
+    model.save(path)
+    with _lock:
+        _model, _model_mtime = model, os.path.getmtime(path)
+    return model.report
+
+
+def load_model():
+    """Return the saved model, reloading it if another process retrained it, or None."""
+    global _model, _model_mtime
+    if not FEEDBACK_MODEL_ENABLED:
+        return None
+    try:
+        mtime = os.path.getmtime(FEEDBACK_MODEL_FILE)
+    except OSError:
+        return None
+    with _lock:
+        if _model is None or mtime != _model_mtime:
+            try:
+                _model, _model_mtime = FeedbackModel.load(FEEDBACK_MODEL_FILE), mtime
+            except Exception as e:
+                print(f"❌ Could not load the feedback model: {e}")
+                return None
+        return _model
+
+
+def _retrain(job):
+    global _retraining
+    try:
+        job.progress("training")
+        return train()
+    except ImportError as e:
+        print(f"❌ The local feedback model needs NumPy: {e}")
+    except Exception as e:
+        print(f"❌ Retraining the feedback model failed: {e}")
+    finally:
+        with _lock:
+            _retraining = False
+    return None
+
+
+def maybe_retrain():
+    """Start training the first model, or retraining once RETRAIN_EVERY new labels have been stored.
+
+    Training a large label set takes tens of seconds, so it runs as a background
+    job. Returns the job id, or None if no retrain is due or one is already running.
+    """
+    global _retraining
+    if not FEEDBACK_MODEL_ENABLED:
+        return None
+    model = load_model()
+    trained = model.report.get("labels", 0) if model else 0
+    if storage.count_feedback_labels() - trained < (RETRAIN_EVERY if model else MIN_TRAINING_LABELS):
+        return None
+    with _lock:
+        if _retraining:
+            return None
+        _retraining = True
+    return jobs.submit_job("retrain", _retrain, label="Retrain the feedback model")
+
+
+def is_trusted(model):
+    """Whether the model agreed with the LLM on at least FEEDBACK_MODEL_MIN_AGREEMENT of its holdout."""
+    agreement = model.report.get("agreement")
+    return agreement is not None and agreement >= FEEDBACK_MODEL_MIN_AGREEMENT
+
+
+def predict_confident(texts):
+    """Return the model's category for each text it is confident about, else None.
+
+    A model below FEEDBACK_MODEL_MIN_AGREEMENT labels nothing, so every text goes to the LLM.
+    """
+    model = load_model() if texts else None
+    if model is None or not is_trusted(model):
+        return [None] * len(texts)
+    predicted, confidences = model.predict(texts)
+    categories = [p if c >= FEEDBACK_MODEL_THRESHOLD else None for p, c in zip(predicted, confidences)]
+    local = sum(category is not None for category in categories)
+    with _lock:
+        _stats["local"] += local
+        _stats["fallback"] += len(texts) - local
+    return categories
+
+
+def counters():
+    """Rows labelled by the local model and rows it passed on to the LLM in this process."""
+    with _lock:
+        return dict(_stats)
+
+
+def main(argv=None):
+    report = train()
+    if report is None:
+        print(f"❌ Need at least {MIN_TRAINING_LABELS} LLM-labelled rows covering two categories to train")
+        return 1
+    print(json.dumps(report, indent=2))
+    if report["agreement"] is None or report["agreement"] < FEEDBACK_MODEL_MIN_AGREEMENT:
+        print(f"❌ Holdout agreement is below {FEEDBACK_MODEL_MIN_AGREEMENT:.0%}; the model will not be used")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
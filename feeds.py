@@ -0,0 +1,187 @@
+"""Watch RSS/Atom feeds and analyze only the entries that are new.
+
+Feeds are polled with conditional GET (ETag / If-Modified-Since), so an
+unchanged feed costs one small request and no parsing. Every entry is
+recorded in the history database's seen-items index. Only entries never seen
+before are fetched and run through the analysis pipeline, with at most
+PER_HOST_LIMIT concurrent requests to any one host.
+
+Usage:
+    python feeds.py feeds.txt [--workers 8] [--per-host 2] [--every 3600] [--backfill] [--no-analyze]
+
+feeds.txt lists one feed URL per line; blank lines and # comments are ignored.
+"""
+import argparse
+import hashlib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+import article_cache
+import extractors
+import storage
+from core import USER_AGENT, fetch_article, run_analysis_pipeline, run_concurrently, ANALYSIS_REUSE_MAX_AGE
+
+# --- Feed settings ---
+FEED_WORKERS = 8
+PER_HOST_LIMIT = 2
+FEED_CONTENT_TYPES = (
+    "application/rss+xml", "application/atom+xml", "application/rdf+xml",
+    "application/xml", "text/xml", "text/html", "text/plain",
+)
+
+_host_locks = {}
+_host_locks_lock = threading.Lock()
+
+
+def read_feed_list(path):
+    """Return the feed URLs listed in a text file."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def host_slot(url, limit=None):
+    """Semaphore limiting concurrent requests to url's host."""
+    host = urlparse(url).netloc.lower()
+    with _host_locks_lock:
+        if host not in _host_locks:
+            _host_locks[host] = threading.BoundedSemaphore(limit or PER_HOST_LIMIT)
+        return _host_locks[host]
+
+
+def entry_key(feed_url, entry):
+    """Identify an entry by its normalized link, so the same article in two feeds is analyzed once."""
+    link = entry.get("link")
+    if link:
+        return article_cache.normalize_url(link)
+    raw = f"{feed_url}#{entry.get('id') or entry.get('title', '')}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def poll_feed(url, backfill=False):
+    """Poll one feed and return its entries that were never seen before, or None if it is unchanged.
+
+    The first successful poll of a feed only records its current entries as
+    seen, unless backfill is set, so adding a feed does not trigger a flood of
+    analyses. Failed polls before it do not count.
+    """
+    state = storage.get_feed(url)
+    headers = {"User-Agent": USER_AGENT}
+    if state and state["etag"]:
+        headers["If-None-Match"] = state["etag"]
+    if state and state["modified"]:
+        headers["If-Modified-Since"] = state["modified"]
+
+    try:
+        with host_slot(url):
+            response, body = extractors.download(url, headers, allowed_types=FEED_CONTENT_TYPES)
+    except Exception as e:
+        storage.save_feed_state(url, status=getattr(getattr(e, "response", None), "status_code", None),
+                                error=str(e))
+        raise
+    if response.status_code == 304:
+        storage.save_feed_state(url, status=304)
+        return None
+
+    # feedparser is only needed when a feed actually changed
+    import feedparser
+
+    parsed = feedparser.parse(body)
+    items = []
+    for entry in parsed.entries:
+        if entry.get("link"):
+            items.append({"key": entry_key(url, entry), "link": entry["link"], "title": entry.get("title")})
+    first_poll = not (state and state["last_success"]) and not backfill
+    new_items = storage.add_feed_items(url, items, status="skipped" if first_poll else "new")
+    storage.save_feed_state(
+        url, etag=response.headers.get("ETag"), modified=response.headers.get("Last-Modified"),
+        status=response.status_code
+    )
+    return [] if first_poll else new_items
+
+
+def analyze_item(item, save_history=True):
+    """Fetch and analyze one feed entry, recording the outcome in the seen-items index."""
+    try:
+        # Only the download holds a per-host slot; the LLM work does not
+        with host_slot(item["link"]):
+            fetch_article(item["link"])
+        # New articles extend the company's analysis rather than replacing it
+        result = run_analysis_pipeline(
+            item["link"], reuse_max_age=ANALYSIS_REUSE_MAX_AGE, incremental=True, save=save_history
+        )
+    except Exception as e:
+        storage.update_feed_item(item["key"], "failed", error=str(e))
+        print(f"❌ {item['link']}: {e}")
+        return None
+    storage.update_feed_item(item["key"], "done", company=result["company"])
+    return result
+
+
+def poll_all(feed_urls, workers=FEED_WORKERS, analyze=True, backfill=False, save_history=True):
+    """Poll every feed, then analyze new entries and any left pending by an earlier run.
+
+    Returns counters for the run.
+    """
+    started = time.perf_counter()
+    stats = {"feeds": len(feed_urls), "not_modified": 0, "feed_errors": 0,
+             "new_items": 0, "analyzed": 0, "failed_items": 0}
+
+    def poll(url):
+        try:
+            return "ok", poll_feed(url, backfill)
+        except Exception as e:
+            print(f"❌ Feed {url}: {e}")
+            return "error", None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for outcome, new_items in executor.map(poll, feed_urls):
+            if outcome == "error":
+                stats["feed_errors"] += 1
+            elif new_items is None:
+                stats["not_modified"] += 1
+            else:
+                stats["new_items"] += len(new_items)
+
+    if analyze:
+        pending = storage.pending_feed_items()
+        if pending:
+            print(f"▶ Analyzing {len(pending)} new item(s)")
+            results = run_concurrently(lambda item: analyze_item(item, save_history), pending, max_workers=workers)
+            stats["analyzed"] = sum(result is not None for result in results)
+            stats["failed_items"] = len(results) - stats["analyzed"]
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def main(argv=None):
+    global PER_HOST_LIMIT
+    parser = argparse.ArgumentParser(description="Poll RSS/Atom feeds and analyze new articles.")
+    parser.add_argument("feeds", help="text file with one feed URL per line")
+    parser.add_argument("-w", "--workers", type=int, default=FEED_WORKERS, help="feeds / items processed in parallel")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_LIMIT, help="concurrent requests per host")
+    parser.add_argument("--every", type=float, help="keep polling, waiting this many seconds between rounds")
+    parser.add_argument("--backfill", action="store_true", help="analyze entries already present on a feed's first poll")
+    parser.add_argument("--no-analyze", action="store_true", help="only record new entries")
+    parser.add_argument("--no-history", action="store_true", help="do not save analyses to the app history")
+    args = parser.parse_args(argv)
+
+    PER_HOST_LIMIT = args.per_host
+    load_dotenv()
+    while True:
+        stats = poll_all(read_feed_list(args.feeds), workers=args.workers, analyze=not args.no_analyze,
+                         backfill=args.backfill, save_history=not args.no_history)
+        print(f"✅ {stats['feeds']} feed(s) in {stats['seconds']:.1f}s: {stats['not_modified']} unchanged, "
+              f"{stats['feed_errors']} failed, {stats['new_items']} new item(s), "
+              f"{stats['analyzed']} analyzed, {stats['failed_items']} failed")
+        if not args.every:
+            return 1 if stats["feed_errors"] or stats["failed_items"] else 0
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""SimHash fingerprints for spotting near-duplicate articles.
+
+A fingerprint is a 64-bit SimHash over the article's three-word shingles.
+Copies of the same press release give fingerprints a few bits apart, so
+similarity is 1 - hamming_distance / 64. For lookup the fingerprint is cut into
+eight 8-bit bands. Any two fingerprints within 7 bits share at least one band
+exactly, so the band index finds every candidate at the default threshold.
+"""
+import hashlib
+import re
+from collections import Counter
+
+BITS = 64
+BANDS = 8
+BAND_BITS = BITS // BANDS
+SHINGLE_WORDS = 3
+
+# Texts shorter than this give unreliable fingerprints and are not matched
+MIN_WORDS = 50
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def simhash(text):
+    """Return the 64-bit SimHash of text, or None if it is too short to fingerprint."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    # Count set bits per position one byte column at a time, so the per-shingle work stays in C
+    value = 0
+    for column in range(8):
+        byte_counts = Counter(digests[column::8])
+        for bit in range(8):
+            ones = sum(count for byte, count in byte_counts.items() if byte >> bit & 1)
+            if ones * 2 > len(shingles):
+                value |= 1 << (column * 8 + bit)
+    return value
+
+
+def similarity(a, b):
+    """Share of matching bits between two fingerprints, from 0.0 to 1.0."""
+    return 1 - bin(a ^ b).count("1") / BITS
+
+
+def band_keys(value):
+    """Index keys for a fingerprint: one integer per band, tagged with the band number."""
+    mask = (1 << BAND_BITS) - 1
+    return [(band << BAND_BITS) | (value >> (band * BAND_BITS) & mask) for band in range(BANDS)]
+
+
+def to_signed(value):
+    """Map an unsigned 64-bit fingerprint into SQLite's signed INTEGER range."""
+    return value - (1 << BITS) if value >= 1 << (BITS - 1) else value
+
+
+def from_signed(value):
+    return value + (1 << BITS) if value < 0 else value
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Job settings (override through the environment) ---
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "3600"))  # seconds finished jobs stay visible
+
+# The pool and registry live at module level, so they outlive Streamlit reruns
+# and are shared by every session in the process
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_jobs = {}
+_lock = threading.Lock()
+
+
+class Job:
+    """A unit of background work with progress that pages can poll."""
+
+    def __init__(self, kind, label):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.label = label
+        self.status = "queued"
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.text = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def progress(self, stage, done=0, total=1):
+        """Record the current stage and how far it has got."""
+        with self._lock:
+            self.stage = stage
+            self.done = done
+            self.total = total
+
+    def append_text(self, stage, delta):
+        """Append streamed output for a stage so pages can show it while it is generated."""
+        with self._lock:
+            self.text[stage] = self.text.get(stage, "") + delta
+
+    def snapshot(self):
+        """Return a consistent copy of the job state."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "label": self.label,
+                "status": self.status,
+                "stage": self.stage,
+                "done": self.done,
+                "total": self.total,
+                "text": dict(self.text),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+
+
+def _run(job, func, args, kwargs):
+    with job._lock:
+        job.status = "running"
+    try:
+        result = func(job, *args, **kwargs)
+    except Exception as e:
+        traceback.print_exc()
+        with job._lock:
+            job.status = "failed"
+            job.error = str(e) or e.__class__.__name__
+            job.finished_at = time.time()
+        return
+    with job._lock:
+        job.status = "done"
+        job.result = result
+        job.finished_at = time.time()
+
+
+def _prune():
+    """Forget finished jobs older than JOB_RETENTION."""
+    cutoff = time.time() - JOB_RETENTION
+    for job_id in [j.id for j in _jobs.values() if j.finished_at and j.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def submit_job(kind, func, *args, label=None, **kwargs):
+    """Run func(job, *args, **kwargs) in the background and return the job id."""
+    job = Job(kind, label or kind)
+    with _lock:
+        _prune()
+        _jobs[job.id] = job
+    _executor.submit(_run, job, func, args, kwargs)
+    return job.id
+
+
+def get_job(job_id):
+    """Return a snapshot of a job, or None if it is unknown or was pruned."""
+    with _lock:
+        job = _jobs.get(job_id)
+    return job.snapshot() if job else None
+
+
+def list_jobs(active_only=False):
+    """Return snapshots of all known jobs, newest first."""
+    with _lock:
+        snapshots = [job.snapshot() for job in _jobs.values()]
+    if active_only:
+        snapshots = [s for s in snapshots if s["status"] in ("queued", "running")]
+    return sorted(snapshots, key=lambda s: s["created_at"], reverse=True)
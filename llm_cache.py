@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- Cache settings (override through the environment) ---
+CACHE_FILE = os.getenv("LLM_CACHE_FILE", "llm_cache.db")
+CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))  # seconds, 0 disables expiry
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+CACHE_LOW_WATER = 0.9  # eviction trims the cache to this share of its limits, so it runs in batches
+EXPIRY_SWEEP_INTERVAL = 60  # seconds between deletions of expired entries
+
+_lock = threading.Lock()
+_conn = None
+_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "writes": 0}
+# Running size of the cache, so puts do not have to scan the table
+_totals = {"entries": 0, "bytes": 0}
+_last_sweep = 0.0
+
+
+def _get_conn():
+    """Open the cache database once per process."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_last_access ON completions(last_access)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_created_at ON completions(created_at)")
+        _conn.commit()
+        _recount(_conn)
+    return _conn
+
+
+def _recount(conn):
+    """Reload the running totals from the table, picking up writes by other processes."""
+    _totals["entries"], _totals["bytes"] = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+    ).fetchone()
+
+
+def make_key(model, messages, temperature=None, **params):
+    """Hash everything that affects the completion into a stable cache key."""
+    payload = {"model": model, "messages": messages, "temperature": temperature}
+    if params:
+        payload["params"] = params
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get(key):
+    """Return the cached response text for key, or None on a miss."""
+    if not CACHE_ENABLED:
+        return None
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute("SELECT response, created_at, size FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            _stats["misses"] += 1
+            return None
+        response, created_at, size = row
+        if CACHE_TTL and now - created_at > CACHE_TTL:
+            if conn.execute("DELETE FROM completions WHERE key = ?", (key,)).rowcount:
+                _totals["entries"] -= 1
+                _totals["bytes"] -= size
+            conn.commit()
+            _stats["expired"] += 1
+            _stats["misses"] += 1
+            return None
+        conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+        conn.commit()
+        _stats["hits"] += 1
+        return response
+
+
+def put(key, response, model=None):
+    """Store a response and evict old entries if the cache is over its limits."""
+    if not CACHE_ENABLED or response is None:
+        return
+    now = time.time()
+    size = len(response.encode("utf-8"))
+    with _lock:
+        conn = _get_conn()
+        old = conn.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO completions (key, model, response, size, created_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, response, size, now, now)
+        )
+        _totals["entries"] += 0 if old else 1
+        _totals["bytes"] += size - (old[0] if old else 0)
+        _stats["writes"] += 1
+        _evict(conn, now)
+        conn.commit()
+
+
+def _over_limits():
+    return _totals["entries"] > CACHE_MAX_ENTRIES or _totals["bytes"] > CACHE_MAX_BYTES
+
+
+def _delete(conn, where, params):
+    """Delete the rows selected by a key subquery and take them off the running totals."""
+    count, total = conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions WHERE key IN ({where})", params
+    ).fetchone()
+    if count:
+        conn.execute(f"DELETE FROM completions WHERE key IN ({where})", params)
+        _totals["entries"] -= count
+        _totals["bytes"] -= total
+        _stats["evictions"] += count
+
+
+def _evict(conn, now):
+    """Drop expired entries now and then, and least recently used ones once over the size limits.
+
+    Eviction goes down to CACHE_LOW_WATER of the limits in one statement, so
+    the next one is only due after many more puts.
+    """
+    global _last_sweep
+    if CACHE_TTL and (now - _last_sweep >= EXPIRY_SWEEP_INTERVAL or _over_limits()):
+        _last_sweep = now
+        _delete(conn, "SELECT key FROM completions WHERE created_at < ?", (now - CACHE_TTL,))
+    if not _over_limits():
+        return
+    _recount(conn)
+    if not _over_limits():
+        return
+    excess_entries = _totals["entries"] - int(CACHE_MAX_ENTRIES * CACHE_LOW_WATER)
+    excess_bytes = _totals["bytes"] - int(CACHE_MAX_BYTES * CACHE_LOW_WATER)
+    evict = max(excess_entries, 0)
+    if excess_bytes > 0:
+        freed = 0
+        for position, (size,) in enumerate(conn.execute("SELECT size FROM completions ORDER BY last_access"), 1):
+            freed += size
+            if freed >= excess_bytes:
+                evict = max(evict, position)
+                break
+    _delete(conn, "SELECT key FROM completions ORDER BY last_access LIMIT ?", (evict,))
+
+
+def stats():
+    """Return hit/miss counters plus the current size of the cache."""
+    with _lock:
+        count, total = _get_conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+        ).fetchone()
+        result = dict(_stats)
+    lookups = result["hits"] + result["misses"]
+    result["entries"] = count
+    result["bytes"] = total
+    result["hit_rate"] = result["hits"] / lookups if lookups else 0.0
+    return result
+
+
+def counters():
+    """Return the in-memory hit/miss counters without querying the database."""
+    with _lock:
+        return dict(_stats)
+
+
+def clear():
+    """Remove every cached completion and reset the counters."""
+    with _lock:
+        conn = _get_conn()
+        conn.execute("DELETE FROM completions")
+        conn.commit()
+        _totals["entries"] = _totals["bytes"] = 0
+        for name in _stats:
+            _stats[name] = 0
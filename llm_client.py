@@ -0,0 +1,207 @@
+import os
+import random
+import threading
+import time
+
+import telemetry
+
+# --- Connection pool and rate limit settings (override through the environment) ---
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "16"))
+REQUEST_TIMEOUT = float(os.getenv("OPENAI_REQUEST_TIMEOUT", "120"))
+REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "6"))
+
+# Completion tokens reserved up front when a request does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 800
+
+_client = None
+_api_key = None
+_base_url = None
+_client_lock = threading.Lock()
+
+
+class TokenBucket:
+    """A token bucket that refills continuously at capacity per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount can be taken (0 if it is available now)."""
+        self._refill(now)
+        # Requests larger than the whole bucket are let through once it is full
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= amount
+
+    def give_back(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Schedules calls against both a requests-per-minute and a tokens-per-minute budget.
+
+    Callers block in acquire() until both buckets have room. A 429 response pauses
+    every caller for the server-suggested (or backoff) delay.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.condition = threading.Condition()
+        self.waiting = 0
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.stats = {"requests": 0, "rate_limited": 0, "retries": 0, "wait_seconds": 0.0}
+
+    def acquire(self, tokens):
+        start = time.monotonic()
+        with self.condition:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = max(
+                        self.paused_until - now,
+                        self.requests.wait_time(1, now),
+                        self.tokens.wait_time(tokens, now),
+                    )
+                    if delay <= 0:
+                        break
+                    self.condition.wait(delay)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                self.in_flight += 1
+                self.stats["requests"] += 1
+                self.stats["wait_seconds"] += time.monotonic() - start
+            finally:
+                self.waiting -= 1
+
+    def release(self, reserved, used=None):
+        """Finish a call, returning unused reserved tokens to the bucket."""
+        with self.condition:
+            self.in_flight -= 1
+            if used is not None and used < reserved:
+                self.tokens.give_back(reserved - used)
+            self.condition.notify_all()
+
+    def pause(self, seconds):
+        """Hold back every caller after the API reported a rate limit."""
+        with self.condition:
+            self.stats["rate_limited"] += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            return dict(self.stats, queue_depth=self.waiting, in_flight=self.in_flight)
+
+
+limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+
+def init_client(api_key=None, base_url=None):
+    """Configure the process-wide client.
+
+    The client itself is built on first use, and only rebuilt if the settings
+    change, so calling this on every Streamlit rerun is cheap.
+    """
+    global _client, _api_key, _base_url
+    with _client_lock:
+        if _client is not None and (api_key, base_url) != (_api_key, _base_url):
+            _client = None
+        _api_key, _base_url = api_key, base_url
+
+
+def get_client():
+    """Return the shared OpenAI client with a pooled keep-alive HTTP connection."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            # openai and httpx take a noticeable time to import, so they load on first use
+            import httpx
+            from openai import OpenAI
+
+            http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10.0),
+            )
+            # Retries are handled here so that they go through the rate limiter
+            _client = OpenAI(
+                api_key=_api_key or os.getenv("OPENAI_API_KEY"), base_url=_base_url,
+                http_client=http_client, max_retries=0
+            )
+        return _client
+
+
+def estimate_request_tokens(messages, max_tokens=None):
+    """Rough token cost of a request, used to reserve room in the TPM bucket."""
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return prompt_chars // 4 + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def _retry_delay(error, attempt):
+    """Honour Retry-After when present, otherwise exponential backoff with full jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after) + random.uniform(0, 0.5)
+        except ValueError:
+            pass
+    return random.uniform(0, min(60.0, 2 ** attempt))
+
+
+def create_chat_completion(**params):
+    """Call chat.completions.create through the rate limiter, retrying 429s and transient errors.
+
+    For stream=True the stream object is returned as soon as the request is accepted.
+    """
+    from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+    client = get_client()
+    reserved = estimate_request_tokens(params.get("messages", []), params.get("max_tokens"))
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire(reserved)
+        used = None
+        try:
+            response = client.chat.completions.create(**params)
+            usage = getattr(response, "usage", None)
+            used = getattr(usage, "total_tokens", None)
+            return response
+        except RateLimitError as error:
+            # The rejected request did not consume tokens
+            used = 0
+            if attempt == MAX_RETRIES:
+                raise
+            limiter.pause(_retry_delay(error, attempt))
+        except (APIConnectionError, APITimeoutError, InternalServerError) as error:
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(_retry_delay(error, attempt))
+        finally:
+            limiter.release(reserved, used)
+        with limiter.condition:
+            limiter.stats["retries"] += 1
+        telemetry.note_retry()
+
+
+def queue_depth():
+    """Number of calls currently waiting for rate-limit capacity."""
+    return limiter.snapshot()["queue_depth"]
+
+
+def stats():
+    """Scheduler counters: requests, retries, 429s, total wait time, queue depth and in-flight calls."""
+    return limiter.snapshot()
@@ -0,0 +1,219 @@
+"""Heuristic company-name detection, tried before asking GPT.
+
+Candidates are capitalised phrases from the title and text, ranked by how
+often they occur, whether they appear in the title and whether they carry a
+legal suffix (Inc, Ltd, ...). Phrases that read as people ("CEO Jane Doe",
+"Jane Doe said") are marked down. guess_company_name reports whether the
+winner is clear enough to use without an LLM call.
+"""
+import re
+from collections import Counter
+from urllib.parse import urlparse
+
+# Only the opening of long articles is scanned; the subject is named early
+SCAN_CHARS = 20000
+
+# Score bonuses and the margin the best candidate needs over the runner-up
+TITLE_BONUS = 3
+SUFFIX_BONUS = 2
+MIN_MENTIONS = 2
+MIN_MARGIN = 1.5
+# Cancels the title bonus, so a person is never a confident guess
+PERSON_PENALTY = TITLE_BONUS
+
+LEGAL_SUFFIXES = {
+    "inc", "inc.", "incorporated", "ltd", "ltd.", "limited", "llc", "corp", "corp.", "corporation",
+    "co", "co.", "company", "plc", "gmbh", "ag", "sa", "s.a.", "nv", "bv", "group", "holdings",
+}
+
+# Capitalised words that start sentences or name things other than companies
+STOPWORDS = {
+    "a", "an", "the", "this", "that", "these", "those", "it", "its", "he", "she", "we", "they", "i", "you",
+    "in", "on", "at", "for", "from", "with", "by", "of", "to", "and", "or", "but", "as", "if", "so",
+    "after", "before", "while", "when", "where", "why", "how", "what", "who", "which", "there", "here",
+    "however", "meanwhile", "according", "also", "both", "each", "some", "many", "most", "more", "other",
+    "new", "our", "their", "his", "her", "your", "my", "all", "one", "two", "first", "last", "next",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "january", "february", "march", "april", "may", "june", "july", "august", "september",
+    "october", "november", "december", "today", "yesterday", "tomorrow",
+    "ceo", "cfo", "cto", "coo", "ai", "us", "usa", "uk", "eu", "un", "ipo", "gdp", "api", "faq",
+    "title", "content", "read", "share", "click", "subscribe", "advertisement", "photo", "image", "video",
+    "company", "inc", "ltd", "corp", "news", "report", "press", "release", "update",
+}
+# Stopwords that also begin names (New York Times, New Balance); kept when another word follows
+NAME_PREFIXES = {"new"}
+
+# One to three capitalised words, allowing inner &, -, ' and . (AT&T, Coca-Cola, McDonald's),
+# after an optional article that does not count towards the three (The New York Times)
+_CANDIDATE_RE = re.compile(
+    r"\b(?:(?:The|A|An)\s+)?[A-Z][\w&'’.-]*[\w&](?:\s+(?:&\s+)?[A-Z][\w&'’.-]*[\w&]){0,2}"
+)
+# A legal suffix right after a candidate, e.g. ", Inc." (matched at the candidate's end)
+_SUFFIX_RE = re.compile(r"[\s,]*(" + "|".join(re.escape(s) for s in sorted(LEGAL_SUFFIXES, key=len, reverse=True))
+                        + r")\b", re.IGNORECASE)
+# " | Publisher", " - Publisher" and similar endings of page titles
+_TITLE_SUFFIX_RE = re.compile(r"\s+[|\-–—:·]\s+[^|\-–—:·]{1,40}$")
+
+# Words around a name that mark it as a person
+_ROLES = r"ceo|chief executive|founder|co-founder|chairman|chairwoman|president"
+_PERSON_BEFORE_RE = re.compile(r"\b(?:" + _ROLES + r"|mr|mrs|ms|dr)\.?,?\s*$", re.IGNORECASE)
+_PERSON_AFTER_RE = re.compile(r"\s*,\s*(?:the\s+|its\s+|[A-Z][\w&.-]*['’]s\s+)?(?i:" + _ROLES + r")\b")
+_SPEECH_RE = re.compile(r"\s*(?:said|says|told|tells|added|adds|wrote|writes|explained|argued|noted)\b")
+_FULL_NAME_RE = re.compile(r"[A-Z][a-z]+ [A-Z][a-z]+")
+
+
+def _key(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _clean(phrase):
+    """Drop leading/trailing stopwords and legal suffixes from a candidate phrase."""
+    words = phrase.replace("’", "'").split()
+    while words and words[0].lower().strip(".") in STOPWORDS and not (
+            words[0].lower() in NAME_PREFIXES and len(words) > 1):
+        words.pop(0)
+    while words and (words[-1].lower() in LEGAL_SUFFIXES or words[-1].lower().strip(".") in STOPWORDS):
+        words.pop()
+    name = " ".join(words).strip(" .-'")
+    if name.endswith("'s"):
+        name = name[:-2]
+    return name
+
+
+def _is_latin(name):
+    return all(ord(char) < 0x250 or not char.isalpha() for char in name)
+
+
+def strip_title_publisher(title, site_name=""):
+    """Remove a trailing " | Publisher" part from a page title."""
+    title = (title or "").strip()
+    match = _TITLE_SUFFIX_RE.search(title)
+    if match and (not site_name or _key(site_name) in _key(match.group())):
+        return title[:match.start()]
+    return title
+
+
+def split_title(text):
+    """Return (title, body) for text from get_article_text or pasted text whose first line looks like a title."""
+    if text.startswith("Title: "):
+        title, _, body = text[len("Title: "):].partition("\n\nContent: ")
+        return title.strip(), body
+    first_line, _, rest = text.strip().partition("\n")
+    if rest and len(first_line) <= 150 and not first_line.rstrip().endswith((".", "!", "?")):
+        return first_line.strip(), rest
+    return "", text
+
+
+def _person_cue(source, match, name):
+    """Whether the words around a candidate say it is a person.
+
+    A role ("CEO Jane Doe", "Jane Doe, the founder") always counts; a speech
+    verb ("Jane Doe said") only after a First Last name, since companies say
+    things too.
+    """
+    offset = max(match.group().find(name.split()[0]), 0)
+    before = source[max(0, match.start() - 40):match.start() + offset]
+    if _PERSON_BEFORE_RE.search(before) or _PERSON_AFTER_RE.match(source, match.end()):
+        return True
+    return bool(_SPEECH_RE.match(source, match.end()) and _FULL_NAME_RE.fullmatch(name))
+
+
+def rank_candidates(title, text, site_name="", url=""):
+    """Score capitalised phrases as company-name candidates; returns [(name, score, mentions)] best first."""
+    text = text[:SCAN_CHARS]
+    mentions = Counter()
+    display = {}
+    with_suffix = set()
+    people = {}
+    for match in _CANDIDATE_RE.finditer(text):
+        name = _clean(match.group())
+        key = _key(name)
+        if not key or len(key) < 2 or key in STOPWORDS or not _is_latin(name):
+            continue
+        mentions[key] += 1
+        display.setdefault(key, name)
+        if _SUFFIX_RE.match(text, match.end()) or match.group().split()[-1].lower() in LEGAL_SUFFIXES:
+            with_suffix.add(key)
+        if _person_cue(text, match, name):
+            people[key] = name
+
+    # Count single words inside longer phrases too, so "Acme" matches "Acme Robotics" mentions
+    for key in list(mentions):
+        name = display[key]
+        if " " in name:
+            first = _key(name.split()[0])
+            if first in mentions and first not in STOPWORDS:
+                mentions[first] += mentions[key]
+
+    title_keys = set()
+    for match in _CANDIDATE_RE.finditer(title):
+        name = _clean(match.group())
+        words = name.split()
+        for word_count in range(1, 4):
+            if len(words) >= word_count:
+                title_keys.add(_key(" ".join(words[:word_count])))
+        if words and _person_cue(title, match, name):
+            people[_key(name)] = name
+
+    # A person's first or last name on its own ("Musk") is that person too
+    people = {key: name for key, name in people.items() if key not in with_suffix}
+    for name in list(people.values()):
+        people.update((_key(word), word) for word in name.split())
+
+    publishers = {_key(site_name)} if site_name else set()
+    if url:
+        host = urlparse(url).netloc.lower().removeprefix("www.")
+        publishers.add(_key(host.split(".")[0]))
+
+    ranked = []
+    for key, count in mentions.items():
+        score = count
+        if key in title_keys and key not in publishers:
+            score += TITLE_BONUS
+        if key in with_suffix:
+            score += SUFFIX_BONUS
+        if key in people:
+            score -= PERSON_PENALTY
+        ranked.append((display[key], score, count))
+    ranked.sort(key=lambda item: (-item[1], -item[2], len(item[0])))
+    return ranked
+
+
+def guess_company_name(title, text, site_name="", url=""):
+    """Return (name, confident) from the heuristics; name is None when nothing plausible was found.
+
+    The guess is confident when the best candidate is mentioned repeatedly,
+    appears in the title or with a legal suffix, and clearly beats the runner-up.
+    When the title names several companies ("Amazon Web Services outage hits
+    Netflix"), only the one named first, the usual subject, can be confident.
+    """
+    title = strip_title_publisher(title, site_name)
+    ranked = rank_candidates(title, text, site_name, url)
+    if not ranked:
+        return None, False
+    name, score, count = ranked[0]
+    runner_up = next((other[1] for other in ranked[1:] if not _extends(other[0], name)), 0)
+    supported = score > count  # got a title or legal-suffix bonus and is not a person
+    confident = count >= MIN_MENTIONS and supported and score >= MIN_MARGIN * runner_up
+    # Candidates that got the title bonus (people lose it again)
+    in_title = [
+        other for other, other_score, other_count in ranked[1:]
+        if other_score - other_count >= TITLE_BONUS and not _extends(other, name) and not _extends(name, other)
+    ]
+    if in_title and min(_title_position(title, other) for other in in_title) < _title_position(title, name):
+        confident = False
+    # Prefer the full form ("Acme Robotics") when it accounts for most mentions of "Acme"
+    for other, _, other_count in ranked[1:]:
+        if _extends(other, name) and other_count * 2 >= count and len(other) > len(name):
+            name = other
+    return name, confident
+
+
+def _title_position(title, name):
+    """Where name first appears in the title, or the title's length if it does not."""
+    match = re.search(r"\b" + re.escape(name), title, re.IGNORECASE)
+    return match.start() if match else len(title)
+
+
+def _extends(longer, shorter):
+    return longer != shorter and _key(longer.split()[0]) == _key(shorter) and " " in longer
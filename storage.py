@@ -0,0 +1,749 @@
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+# --- Database settings ---
+HISTORY_DB_FILE = os.getenv("HISTORY_DB_FILE", "history.db")
+
+# Legacy CSV files imported once by migrate_from_csv
+INSIGHTS_FILE = "insights.csv"
+ANALYSIS_HISTORY_FILE = "analysis_history.csv"
+COMPARE_HISTORY_FILE = "compare_history.csv"
+
+# Above this many hits, search results are ordered by recency instead of relevance
+RANKED_SEARCH_LIMIT = 2000
+# Hit counts are capped here so broad queries stay fast; pages show "10000+" beyond it
+MAX_SEARCH_COUNT = 10000
+
+SCHEMA = """
+-- Company names are matched without regard to case everywhere, like in chunk_analyses
+CREATE TABLE IF NOT EXISTS analyses (
+    company TEXT PRIMARY KEY COLLATE NOCASE,
+    analysis TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    source_hash TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_updated_at ON analyses(updated_at);
+
+-- Per-chunk analyses, so a company's analysis can grow one article at a time.
+-- merged marks the chunks folded into the company's saved analysis.
+CREATE TABLE IF NOT EXISTS chunk_analyses (
+    company TEXT NOT NULL COLLATE NOCASE,
+    chunk_hash TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    merged INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (company, chunk_hash)
+);
+
+CREATE TABLE IF NOT EXISTS comparisons (
+    name TEXT PRIMARY KEY,
+    company1 TEXT,
+    company2 TEXT,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_comparisons_company1 ON comparisons(company1);
+CREATE INDEX IF NOT EXISTS idx_comparisons_company2 ON comparisons(company2);
+CREATE INDEX IF NOT EXISTS idx_comparisons_updated_at ON comparisons(updated_at);
+
+-- Building blocks of the comparison matrix, keyed by the analyses they were made from:
+-- compact per-section summaries of one analysis and section-by-section verdicts for a pair
+CREATE TABLE IF NOT EXISTS section_summaries (
+    analysis_hash TEXT PRIMARY KEY,
+    company TEXT NOT NULL,
+    sections TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pair_comparisons (
+    company1 TEXT NOT NULL COLLATE NOCASE,
+    analysis_hash1 TEXT NOT NULL,
+    company2 TEXT NOT NULL COLLATE NOCASE,
+    analysis_hash2 TEXT NOT NULL,
+    sections TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (company1, analysis_hash1, company2, analysis_hash2)
+);
+
+CREATE TABLE IF NOT EXISTS insights (
+    company TEXT PRIMARY KEY,
+    improve TEXT NOT NULL DEFAULT '',
+    keep TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL
+);
+
+-- Full-text indexes, kept in sync with their tables by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5(
+    company, analysis, summary, content='analyses', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS analyses_fts_insert AFTER INSERT ON analyses BEGIN
+    INSERT INTO analyses_fts (rowid, company, analysis, summary)
+    VALUES (new.rowid, new.company, new.analysis, new.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS analyses_fts_delete AFTER DELETE ON analyses BEGIN
+    INSERT INTO analyses_fts (analyses_fts, rowid, company, analysis, summary)
+    VALUES ('delete', old.rowid, old.company, old.analysis, old.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS analyses_fts_update AFTER UPDATE ON analyses BEGIN
+    INSERT INTO analyses_fts (analyses_fts, rowid, company, analysis, summary)
+    VALUES ('delete', old.rowid, old.company, old.analysis, old.summary);
+    INSERT INTO analyses_fts (rowid, company, analysis, summary)
+    VALUES (new.rowid, new.company, new.analysis, new.summary);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS comparisons_fts USING fts5(
+    name, result, content='comparisons', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS comparisons_fts_insert AFTER INSERT ON comparisons BEGIN
+    INSERT INTO comparisons_fts (rowid, name, result) VALUES (new.rowid, new.name, new.result);
+END;
+CREATE TRIGGER IF NOT EXISTS comparisons_fts_delete AFTER DELETE ON comparisons BEGIN
+    INSERT INTO comparisons_fts (comparisons_fts, rowid, name, result)
+    VALUES ('delete', old.rowid, old.name, old.result);
+END;
+CREATE TRIGGER IF NOT EXISTS comparisons_fts_update AFTER UPDATE ON comparisons BEGIN
+    INSERT INTO comparisons_fts (comparisons_fts, rowid, name, result)
+    VALUES ('delete', old.rowid, old.name, old.result);
+    INSERT INTO comparisons_fts (rowid, name, result) VALUES (new.rowid, new.name, new.result);
+END;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- SimHash fingerprints of analyzed articles, indexed by band for near-duplicate lookup
+CREATE TABLE IF NOT EXISTS fingerprints (
+    source_hash TEXT PRIMARY KEY,
+    company TEXT NOT NULL,
+    simhash INTEGER NOT NULL,
+    url TEXT,
+    chunk_hashes TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprint_bands (
+    band_key INTEGER NOT NULL,
+    source_hash TEXT NOT NULL,
+    PRIMARY KEY (band_key, source_hash)
+) WITHOUT ROWID;
+
+-- Feedback categories given by the LLM; training data for the local feedback model
+CREATE TABLE IF NOT EXISTS feedback_labels (
+    text_key TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    category TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_labels_created_at ON feedback_labels(created_at);
+
+-- Watched RSS/Atom feeds and every entry seen in them
+CREATE TABLE IF NOT EXISTS feeds (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    modified TEXT,
+    last_polled REAL,
+    last_status INTEGER,
+    last_error TEXT,
+    last_success REAL
+);
+CREATE TABLE IF NOT EXISTS feed_items (
+    item_key TEXT PRIMARY KEY,
+    feed_url TEXT NOT NULL,
+    link TEXT NOT NULL,
+    title TEXT,
+    status TEXT NOT NULL,
+    company TEXT,
+    error TEXT,
+    seen_at REAL NOT NULL,
+    processed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_feed_items_status ON feed_items(status);
+"""
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def _get_conn():
+    """Return this thread's connection, creating the schema on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != HISTORY_DB_FILE:
+        conn = sqlite3.connect(HISTORY_DB_FILE, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _schema_lock:
+            if HISTORY_DB_FILE not in _schema_ready:
+                fts_missing = not conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'analyses_fts'"
+                ).fetchone()
+                conn.executescript(SCHEMA)
+                _add_missing_columns(conn)
+                if fts_missing:
+                    # Index rows saved before the full-text tables existed
+                    with conn:
+                        conn.execute("INSERT INTO analyses_fts (analyses_fts) VALUES ('rebuild')")
+                        conn.execute("INSERT INTO comparisons_fts (comparisons_fts) VALUES ('rebuild')")
+                _schema_ready.add(HISTORY_DB_FILE)
+        _local.conn = conn
+        _local.path = HISTORY_DB_FILE
+    return conn
+
+
+def _add_missing_columns(conn):
+    """Bring tables created by older versions up to the current schema."""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(analyses)")}
+    if "source_hash" not in columns:
+        conn.execute("ALTER TABLE analyses ADD COLUMN source_hash TEXT")
+    table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'analyses'").fetchone()[0]
+    if "COLLATE NOCASE" not in table_sql:
+        _rebuild_analyses_nocase(conn)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_analyses_source_hash ON analyses(source_hash)"
+    )
+    chunk_columns = {row["name"] for row in conn.execute("PRAGMA table_info(chunk_analyses)")}
+    if "merged" not in chunk_columns:
+        # Chunks stored before this column existed were all part of their company's analysis
+        conn.execute("ALTER TABLE chunk_analyses ADD COLUMN merged INTEGER NOT NULL DEFAULT 1")
+    fingerprint_columns = {row["name"] for row in conn.execute("PRAGMA table_info(fingerprints)")}
+    if "chunk_hashes" not in fingerprint_columns:
+        conn.execute("ALTER TABLE fingerprints ADD COLUMN chunk_hashes TEXT")
+    feed_columns = {row["name"] for row in conn.execute("PRAGMA table_info(feeds)")}
+    if "last_success" not in feed_columns:
+        conn.execute("ALTER TABLE feeds ADD COLUMN last_success REAL")
+        # A feed whose entries were recorded, or whose last poll worked, was polled successfully before
+        conn.execute(
+            "UPDATE feeds SET last_success = last_polled "
+            "WHERE last_status IN (200, 304) OR url IN (SELECT feed_url FROM feed_items)"
+        )
+    conn.commit()
+
+
+def _rebuild_analyses_nocase(conn):
+    """Recreate the analyses table with a case-insensitive company key.
+
+    Of rows whose names differ only in case, the most recently updated one is kept.
+    """
+    conn.commit()
+    with conn:
+        for name in ("analyses_fts_insert", "analyses_fts_delete", "analyses_fts_update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for name in ("idx_analyses_company_nocase", "idx_analyses_updated_at", "idx_analyses_source_hash"):
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.execute("ALTER TABLE analyses RENAME TO analyses_old")
+    # Recreates the table with its indexes and full-text triggers
+    conn.executescript(SCHEMA)
+    with conn:
+        conn.execute("INSERT INTO analyses_fts (analyses_fts) VALUES ('delete-all')")
+        conn.execute(
+            """
+            INSERT INTO analyses (company, analysis, summary, source_hash, created_at, updated_at)
+            SELECT company, analysis, summary, source_hash, created_at, updated_at FROM analyses_old AS a
+            WHERE NOT EXISTS (
+                SELECT 1 FROM analyses_old AS b
+                WHERE b.company = a.company COLLATE NOCASE
+                  AND (b.updated_at > a.updated_at OR (b.updated_at = a.updated_at AND b.rowid > a.rowid))
+            )
+            """
+        )
+        conn.execute("DROP TABLE analyses_old")
+
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _search(table, key_column, rank, query, limit, offset):
+    """Run a full-text query against table's FTS index and page through the hits.
+
+    Small result sets are ordered by relevance. Ranking every hit of a very broad
+    query is slow, so those are ordered newest first instead.
+    """
+    match = _fts_query(query)
+    if not match:
+        return [], 0
+    conn = _get_conn()
+    fts = f"{table}_fts"
+    total = conn.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM {fts} WHERE {fts} MATCH ? LIMIT ?)",
+        (match, MAX_SEARCH_COUNT)
+    ).fetchone()[0]
+    # bm25 is lower for better matches; rowid is higher for newer rows
+    position, direction = (rank, "ASC") if total <= RANKED_SEARCH_LIMIT else ("rowid", "DESC")
+    rows = conn.execute(
+        f"""
+        SELECT t.{key_column} AS key, t.updated_at FROM (
+            SELECT rowid, {position} AS position FROM {fts} WHERE {fts} MATCH ?
+            ORDER BY position {direction} LIMIT ? OFFSET ?
+        ) hits
+        JOIN {table} t ON t.rowid = hits.rowid
+        ORDER BY hits.position {direction}
+        """,
+        (match, limit, offset)
+    ).fetchall()
+    return [(row["key"], row["updated_at"]) for row in rows], total
+
+
+# --- Analyses ---
+def save_analysis(company, analysis, summary="", source_hash=None, chunk_hashes=None, replace_chunks=True,
+                  expected_updated_at=None):
+    """Insert or update the analysis for one company.
+
+    source_hash identifies the text it was computed from, so it can be reused.
+    chunk_hashes are the chunks the analysis covers; they are marked merged in
+    the same transaction, and with replace_chunks every other chunk of the
+    company is unmarked. With expected_updated_at the write only happens if the
+    stored row still has that updated_at (0 when there must be no row yet);
+    returns whether the analysis was saved.
+    """
+    now = time.time()
+    conn = _get_conn()
+    with conn:
+        if expected_updated_at is not None:
+            # Take the write lock before checking, so no other writer can slip in between
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT updated_at FROM analyses WHERE company = ?", (company,)).fetchone()
+            if (row["updated_at"] if row else 0) != expected_updated_at:
+                return False
+        conn.execute(
+            """
+            INSERT INTO analyses (company, analysis, summary, source_hash, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(company) DO UPDATE SET
+                analysis = excluded.analysis,
+                summary = excluded.summary,
+                source_hash = excluded.source_hash,
+                updated_at = excluded.updated_at
+            """,
+            (company, analysis, summary or "", source_hash, now, now)
+        )
+        if chunk_hashes is not None:
+            if replace_chunks:
+                conn.execute("UPDATE chunk_analyses SET merged = 0 WHERE company = ?", (company,))
+            hashes = list(dict.fromkeys(chunk_hashes))
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                conn.execute(
+                    f"UPDATE chunk_analyses SET merged = 1 "
+                    f"WHERE company = ? AND chunk_hash IN ({', '.join('?' * len(batch))})",
+                    (company, *batch)
+                )
+    return True
+
+
+def get_analysis(company):
+    """Return {"analysis", "summary", "source_hash", "updated_at"} for a company, or None."""
+    row = _get_conn().execute(
+        "SELECT analysis, summary, source_hash, updated_at FROM analyses WHERE company = ?", (company,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def find_analysis(company, source_hash, max_age=None):
+    """Return a stored analysis of company computed from the same source, or None.
+
+    Entries older than max_age seconds are ignored.
+    """
+    oldest = time.time() - max_age if max_age else 0
+    row = _get_conn().execute(
+        """
+        SELECT company, analysis, summary, updated_at FROM analyses
+        WHERE source_hash = ? AND company = ? COLLATE NOCASE AND updated_at >= ?
+        """,
+        (source_hash, company, oldest)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def list_analyses(limit=None, offset=0):
+    """Return (company, updated_at) pairs, newest first, without loading analysis bodies."""
+    rows = _get_conn().execute(
+        "SELECT company, updated_at FROM analyses ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+        (-1 if limit is None else limit, offset)
+    ).fetchall()
+    return [(row["company"], row["updated_at"]) for row in rows]
+
+
+def count_analyses():
+    return _get_conn().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+
+def search_analyses(query, limit=20, offset=0):
+    """Full-text search over company names, analyses and summaries.
+
+    Returns ([(company, updated_at), ...], total_matches).
+    """
+    return _search("analyses", "company", "bm25(analyses_fts, 10.0, 1.0, 2.0)", query, limit, offset)
+
+
+def get_chunk_analyses(company, chunk_hashes):
+    """Return {chunk_hash: analysis} for the chunks already analyzed for company."""
+    hashes = list(dict.fromkeys(chunk_hashes))
+    conn = _get_conn()
+    found = {}
+    # Stay below SQLite's limit on query parameters
+    for i in range(0, len(hashes), 500):
+        batch = hashes[i:i + 500]
+        rows = conn.execute(
+            f"SELECT chunk_hash, analysis FROM chunk_analyses "
+            f"WHERE company = ? AND chunk_hash IN ({', '.join('?' * len(batch))})",
+            (company, *batch)
+        ).fetchall()
+        found.update((row["chunk_hash"], row["analysis"]) for row in rows)
+    return found
+
+
+def merged_chunk_hashes(company, chunk_hashes):
+    """Return the given chunks that are already part of company's saved analysis."""
+    hashes = list(dict.fromkeys(chunk_hashes))
+    conn = _get_conn()
+    merged = set()
+    for i in range(0, len(hashes), 500):
+        batch = hashes[i:i + 500]
+        rows = conn.execute(
+            f"SELECT chunk_hash FROM chunk_analyses "
+            f"WHERE company = ? AND merged = 1 AND chunk_hash IN ({', '.join('?' * len(batch))})",
+            (company, *batch)
+        ).fetchall()
+        merged.update(row["chunk_hash"] for row in rows)
+    return merged
+
+
+def save_chunk_analyses(company, analyses):
+    """Store {chunk_hash: analysis} results for company.
+
+    New chunks start unmerged; save_analysis marks them once the analysis containing them is saved.
+    """
+    now = time.time()
+    conn = _get_conn()
+    with conn:
+        conn.executemany(
+            "INSERT INTO chunk_analyses (company, chunk_hash, analysis, created_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(company, chunk_hash) DO UPDATE SET analysis = excluded.analysis",
+            [(company, chunk_hash, analysis, now) for chunk_hash, analysis in analyses.items()]
+        )
+
+
+# --- Fingerprints ---
+def save_fingerprint(source_hash, company, simhash, band_keys, url=None, chunk_hashes=None):
+    """Store an article fingerprint (a signed 64-bit integer), its band index keys and its chunk hashes."""
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO fingerprints (source_hash, company, simhash, url, chunk_hashes, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (source_hash, company, simhash, url, json.dumps(list(chunk_hashes or [])), time.time())
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO fingerprint_bands (band_key, source_hash) VALUES (?, ?)",
+            [(key, source_hash) for key in band_keys]
+        )
+
+
+def find_fingerprint_candidates(band_keys):
+    """Return stored fingerprints sharing at least one band key, as dicts."""
+    rows = _get_conn().execute(
+        f"""
+        SELECT f.source_hash, f.company, f.simhash, f.url, f.chunk_hashes, f.created_at FROM fingerprints f
+        WHERE f.source_hash IN (
+            SELECT source_hash FROM fingerprint_bands WHERE band_key IN ({', '.join('?' * len(band_keys))})
+        )
+        """,
+        list(band_keys)
+    ).fetchall()
+    return [dict(row, chunk_hashes=json.loads(row["chunk_hashes"] or "[]")) for row in rows]
+
+
+# --- Comparisons ---
+def save_comparison(name, result, company1=None, company2=None):
+    """Insert or update a comparison result."""
+    now = time.time()
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO comparisons (name, company1, company2, result, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                company1 = excluded.company1,
+                company2 = excluded.company2,
+                result = excluded.result,
+                updated_at = excluded.updated_at
+            """,
+            (name, company1, company2, result, now, now)
+        )
+
+
+def get_comparison(name):
+    """Return the stored comparison text, or None."""
+    row = _get_conn().execute("SELECT result FROM comparisons WHERE name = ?", (name,)).fetchone()
+    return row["result"] if row else None
+
+
+def list_comparisons(limit=None, offset=0):
+    """Return (name, updated_at) pairs, newest first, without loading results."""
+    rows = _get_conn().execute(
+        "SELECT name, updated_at FROM comparisons ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+        (-1 if limit is None else limit, offset)
+    ).fetchall()
+    return [(row["name"], row["updated_at"]) for row in rows]
+
+
+def count_comparisons():
+    return _get_conn().execute("SELECT COUNT(*) FROM comparisons").fetchone()[0]
+
+
+def search_comparisons(query, limit=20, offset=0):
+    """Full-text search over comparison names and results.
+
+    Returns ([(name, updated_at), ...], total_matches).
+    """
+    return _search("comparisons", "name", "bm25(comparisons_fts, 10.0, 1.0)", query, limit, offset)
+
+
+# --- Comparison matrix ---
+def get_section_summaries(analysis_hash):
+    """Return the stored {section_key: summary} for an analysis, or None."""
+    row = _get_conn().execute(
+        "SELECT sections FROM section_summaries WHERE analysis_hash = ?", (analysis_hash,)
+    ).fetchone()
+    return json.loads(row["sections"]) if row else None
+
+
+def save_section_summaries(analysis_hash, company, sections):
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO section_summaries (analysis_hash, company, sections, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (analysis_hash, company, json.dumps(sections), time.time())
+        )
+
+
+def get_pair_comparison(company1, analysis_hash1, company2, analysis_hash2):
+    """Return the stored section comparison of two analyses in this order, or None."""
+    row = _get_conn().execute(
+        "SELECT sections FROM pair_comparisons WHERE company1 = ? AND analysis_hash1 = ? "
+        "AND company2 = ? AND analysis_hash2 = ?",
+        (company1, analysis_hash1, company2, analysis_hash2)
+    ).fetchone()
+    return json.loads(row["sections"]) if row else None
+
+
+def save_pair_comparison(company1, analysis_hash1, company2, analysis_hash2, sections):
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO pair_comparisons "
+            "(company1, analysis_hash1, company2, analysis_hash2, sections, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (company1, analysis_hash1, company2, analysis_hash2, json.dumps(sections), time.time())
+        )
+
+
+# --- Feedback labels ---
+def save_feedback_labels(labels):
+    """Store {text_key: (text, category)} labels."""
+    now = time.time()
+    conn = _get_conn()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO feedback_labels (text_key, text, category, created_at) VALUES (?, ?, ?, ?)",
+            [(key, text, category, now) for key, (text, category) in labels.items()]
+        )
+
+
+def get_feedback_labels(text_keys):
+    """Return {text_key: category} for the keys that have a stored label."""
+    keys = list(dict.fromkeys(text_keys))
+    conn = _get_conn()
+    found = {}
+    for i in range(0, len(keys), 500):
+        batch = keys[i:i + 500]
+        rows = conn.execute(
+            f"SELECT text_key, category FROM feedback_labels WHERE text_key IN ({', '.join('?' * len(batch))})",
+            batch
+        ).fetchall()
+        found.update((row["text_key"], row["category"]) for row in rows)
+    return found
+
+
+def load_feedback_labels(limit=None):
+    """Return (text_key, text, category) tuples, newest first."""
+    rows = _get_conn().execute(
+        "SELECT text_key, text, category FROM feedback_labels ORDER BY created_at DESC LIMIT ?",
+        (-1 if limit is None else limit,)
+    ).fetchall()
+    return [(row["text_key"], row["text"], row["category"]) for row in rows]
+
+
+def count_feedback_labels():
+    return _get_conn().execute("SELECT COUNT(*) FROM feedback_labels").fetchone()[0]
+
+
+# --- Insights ---
+def save_insight(company, improve, keep):
+    """Insert or update the improvement / preservation notes for a company."""
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO insights (company, improve, keep, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(company) DO UPDATE SET
+                improve = excluded.improve,
+                keep = excluded.keep,
+                updated_at = excluded.updated_at
+            """,
+            (company, improve or "", keep or "", time.time())
+        )
+
+
+def get_insight(company):
+    """Return {"improve", "keep"} for a company, or None."""
+    row = _get_conn().execute("SELECT improve, keep FROM insights WHERE company = ?", (company,)).fetchone()
+    return dict(row) if row else None
+
+
+def delete_insight(company):
+    conn = _get_conn()
+    with conn:
+        conn.execute("DELETE FROM insights WHERE company = ?", (company,))
+
+
+def list_insight_companies():
+    rows = _get_conn().execute("SELECT company FROM insights ORDER BY company").fetchall()
+    return [row["company"] for row in rows]
+
+
+# --- Feeds ---
+def get_feed(url):
+    """Return the stored poll state of a feed ({"etag", "modified", "last_polled", ...}), or None."""
+    row = _get_conn().execute("SELECT * FROM feeds WHERE url = ?", (url,)).fetchone()
+    return dict(row) if row else None
+
+
+def save_feed_state(url, etag=None, modified=None, status=None, error=None):
+    """Record the outcome of polling a feed. etag / modified are kept when not given.
+
+    A 2xx or 304 status also sets last_success; a failure keeps the previous one.
+    """
+    now = time.time()
+    succeeded = status == 304 or (status is not None and 200 <= status < 300)
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO feeds (url, etag, modified, last_polled, last_status, last_error, last_success)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag = COALESCE(excluded.etag, feeds.etag),
+                modified = COALESCE(excluded.modified, feeds.modified),
+                last_polled = excluded.last_polled,
+                last_status = excluded.last_status,
+                last_error = excluded.last_error,
+                last_success = COALESCE(excluded.last_success, feeds.last_success)
+            """,
+            (url, etag, modified, now, status, error, now if succeeded else None)
+        )
+
+
+def add_feed_items(feed_url, items, status="new"):
+    """Record feed entries; returns the ones not seen before.
+
+    items are dicts with "key", "link" and "title". Entries whose key is
+    already stored, from any feed, are skipped.
+    """
+    now = time.time()
+    added = []
+    conn = _get_conn()
+    with conn:
+        for item in items:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO feed_items (item_key, feed_url, link, title, status, seen_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (item["key"], feed_url, item["link"], item.get("title"), status, now)
+            )
+            if cur.rowcount:
+                added.append(item)
+    return added
+
+
+def update_feed_item(item_key, status, company=None, error=None):
+    """Mark a feed entry as done or failed."""
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            "UPDATE feed_items SET status = ?, company = ?, error = ?, processed_at = ? WHERE item_key = ?",
+            (status, company, error, time.time(), item_key)
+        )
+
+
+def pending_feed_items(limit=None):
+    """Entries seen but not yet analyzed, oldest first, e.g. left over from an interrupted run."""
+    rows = _get_conn().execute(
+        "SELECT item_key AS key, feed_url, link, title FROM feed_items WHERE status = 'new' "
+        "ORDER BY seen_at LIMIT ?",
+        (-1 if limit is None else limit,)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+# --- Migration from the old CSV files ---
+def _read_csv(path):
+    csv.field_size_limit(sys.maxsize)
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def migrate_from_csv(analysis_file=ANALYSIS_HISTORY_FILE, compare_file=COMPARE_HISTORY_FILE,
+                     insights_file=INSIGHTS_FILE):
+    """Import the legacy CSV history once; rows already in the database are left alone.
+
+    Returns the number of imported rows per table, or None if the import already ran.
+    """
+    conn = _get_conn()
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'csv_migrated'").fetchone():
+        return None
+
+    now = time.time()
+    imported = {"analyses": 0, "comparisons": 0, "insights": 0}
+    with conn:
+        if os.path.exists(analysis_file):
+            for row in _read_csv(analysis_file):
+                if row.get("Company"):
+                    cur = conn.execute(
+                        "INSERT OR IGNORE INTO analyses (company, analysis, summary, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (row["Company"], row.get("Analysis") or "", row.get("Summary") or "", now, now)
+                    )
+                    imported["analyses"] += cur.rowcount
+        if os.path.exists(compare_file):
+            for row in _read_csv(compare_file):
+                if row.get("Comparison"):
+                    company1, _, company2 = row["Comparison"].partition(" vs ")
+                    cur = conn.execute(
+                        "INSERT OR IGNORE INTO comparisons (name, company1, company2, result, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (row["Comparison"], company1 or None, company2 or None, row.get("Result") or "", now, now)
+                    )
+                    imported["comparisons"] += cur.rowcount
+        if os.path.exists(insights_file):
+            for row in _read_csv(insights_file):
+                if row.get("Company"):
+                    cur = conn.execute(
+                        "INSERT OR IGNORE INTO insights (company, improve, keep, updated_at) VALUES (?, ?, ?, ?)",
+                        (row["Company"], row.get("Improve") or "", row.get("Keep") or "", now)
+                    )
+                    imported["insights"] += cur.rowcount
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_migrated', ?)", (str(now),))
+    return imported
@@ -0,0 +1,321 @@
+"""Tracing and metrics for LLM calls and pipeline stages.
+
+Every completion is recorded with its model, latency, token usage, retries and
+whether the cache answered it. Every pipeline stage is recorded as a span.
+Records go to the active trace, so a pipeline run can report its own totals.
+They also feed process-wide counters, served in Prometheus text format, and
+an optional JSONL metrics file.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Telemetry settings (override through the environment) ---
+TELEMETRY_FILE = os.getenv("TELEMETRY_FILE", "telemetry.jsonl")  # empty disables the file
+TELEMETRY_MAX_BYTES = int(os.getenv("TELEMETRY_MAX_BYTES", str(50 * 1024 * 1024)))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 disables the /metrics endpoint
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Context variables follow a pipeline into worker threads when the work is
+# submitted with contextvars.copy_context()
+_current_trace = contextvars.ContextVar("telemetry_trace", default=None)
+_current_call = contextvars.ContextVar("telemetry_call", default=None)
+
+_lock = threading.Lock()
+_file_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_server = None
+
+USAGE_FIELDS = ["prompt_tokens", "completion_tokens", "cached_tokens"]
+
+
+class Trace:
+    """Stage timings and LLM totals for one pipeline run."""
+
+    def __init__(self, name, parent=None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.finished = None
+        self.stages = {}
+        self.totals = {"calls": 0, "cache_hits": 0, "retries": 0, "errors": 0, "llm_seconds": 0.0}
+        self.totals.update({field: 0 for field in USAGE_FIELDS})
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_call(self, record):
+        """Count a call here and in every enclosing trace."""
+        trace = self
+        while trace is not None:
+            with trace._lock:
+                totals = trace.totals
+                totals["calls"] += 1
+                totals["cache_hits"] += record["cache_hit"]
+                totals["retries"] += record["retries"]
+                totals["errors"] += record["error"] is not None
+                totals["llm_seconds"] += record["seconds"]
+                for field in USAGE_FIELDS:
+                    totals[field] += record[field]
+            trace = trace.parent
+
+    def summary(self):
+        """Return the run's wall time, stage timings and LLM totals as a plain dict."""
+        end = self.finished or time.perf_counter()
+        with self._lock:
+            return dict(self.totals, name=self.name, seconds=end - self.started,
+                        stages=dict(self.stages), **self.attrs)
+
+
+class LLMCall:
+    """One completion request. The caller fills it in and it is recorded when the block exits."""
+
+    def __init__(self, model, stream):
+        self.model = model
+        self.stream = stream
+        self.cache_hit = False
+        self.usage = None
+        self.retries = 0
+        self.error = None
+        self.first_token_seconds = None
+        self.started = time.perf_counter()
+
+    def first_token(self):
+        """Note the time to the first streamed token."""
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self.started
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(name, **attrs):
+    """Start a trace for a pipeline run, nested under the active trace if there is one."""
+    run = Trace(name, _current_trace.get(), **attrs)
+    token = _current_trace.set(run)
+    status = "ok"
+    try:
+        yield run
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        run.finished = time.perf_counter()
+        _current_trace.reset(token)
+        _increment("pipeline_runs_total", {"pipeline": name, "status": status})
+        _write({"type": "trace", "status": status, **run.summary()})
+
+
+@contextmanager
+def span(stage):
+    """Time one pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        run = _current_trace.get()
+        if run is not None:
+            run.add_stage(stage, seconds)
+        _observe("pipeline_stage_seconds", {"stage": stage}, seconds)
+
+
+@contextmanager
+def llm_call(model, stream=False):
+    """Record a completion request; usage, cache_hit and first_token are set on the yielded LLMCall."""
+    call = LLMCall(model, stream)
+    try:
+        yield call
+    except Exception as e:
+        call.error = type(e).__name__
+        raise
+    finally:
+        _record(call, time.perf_counter() - call.started)
+
+
+@contextmanager
+def counting_retries(call):
+    """Attribute retries reported by note_retry() inside the block to call."""
+    token = _current_call.set(call)
+    try:
+        yield
+    finally:
+        _current_call.reset(token)
+
+
+def note_retry():
+    """Called by the API client each time it retries a request."""
+    call = _current_call.get()
+    if call is not None:
+        call.retries += 1
+
+
+def _usage_numbers(usage):
+    """Pull prompt, completion and cached prompt token counts out of an API usage object."""
+    if usage is None:
+        return {field: 0 for field in USAGE_FIELDS}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+    }
+
+
+def _record(call, seconds):
+    run = _current_trace.get()
+    record = {
+        "model": call.model,
+        "seconds": seconds,
+        "first_token_seconds": call.first_token_seconds,
+        "stream": call.stream,
+        "cache_hit": call.cache_hit,
+        "retries": call.retries,
+        "error": call.error,
+        **_usage_numbers(call.usage),
+    }
+    if run is not None:
+        run.add_call(record)
+
+    model = {"model": call.model}
+    _increment("llm_requests_total", dict(model, cache="hit" if call.cache_hit else "miss"))
+    if call.retries:
+        _increment("llm_retries_total", model, call.retries)
+    if call.error:
+        _increment("llm_errors_total", dict(model, error=call.error))
+    for field in USAGE_FIELDS:
+        if record[field]:
+            _increment("llm_tokens_total", dict(model, kind=field.replace("_tokens", "")), record[field])
+    if not call.cache_hit:
+        _observe("llm_request_seconds", model, seconds)
+    _write({"type": "llm_call", "trace": run.name if run else None, **record})
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _increment(name, labels, value=1):
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _observe(name, labels, value):
+    key = (name, _label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def _write(event):
+    """Append one event to the metrics file, rotating it once it grows past TELEMETRY_MAX_BYTES."""
+    if not TELEMETRY_FILE:
+        return
+    line = json.dumps(dict(event, ts=time.time()), ensure_ascii=False, default=str) + "\n"
+    with _file_lock:
+        try:
+            if TELEMETRY_MAX_BYTES and os.path.exists(TELEMETRY_FILE) \
+                    and os.path.getsize(TELEMETRY_FILE) > TELEMETRY_MAX_BYTES:
+                os.replace(TELEMETRY_FILE, TELEMETRY_FILE + ".1")
+            with open(TELEMETRY_FILE, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            print(f"❌ Failed to write telemetry: {e}")
+
+
+def totals():
+    """Process-wide LLM request and token counts, summed over models."""
+    result = {"requests": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            labels = dict(labels)
+            if name == "llm_requests_total":
+                result["requests"] += value
+                if labels["cache"] == "hit":
+                    result["cache_hits"] += value
+            elif name == "llm_tokens_total":
+                result[f"{labels['kind']}_tokens"] += value
+    return result
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """Render every counter and histogram in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, dict(h, buckets=list(h["buckets"]))) for key, h in _histograms.items())
+    lines = []
+    declared = set()
+    for (name, labels), value in counters:
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), histogram in histograms:
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port=None):
+    """Serve /metrics on port (default METRICS_PORT) in a background thread, once per process."""
+    global _server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                print(f"❌ Could not start metrics endpoint on port {port}: {e}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server